@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     name = 'authentication'
+
+    def ready(self):
+        from questionnaire import metrics
+        from . import signals  # noqa: F401
+        from .cache import collect_metrics
+        from .hashing import collect_metrics as collect_hashing_metrics
+        from .revocation import collect_metrics as collect_revocation_metrics
+
+        metrics.register_collector(collect_metrics)
+        metrics.register_collector(collect_hashing_metrics)
+        metrics.register_collector(collect_revocation_metrics)
@@ -2,7 +2,11 @@ import jwt
 
 from django.conf import settings
 from rest_framework import authentication, exceptions
-from .models import User
+
+from questionnaire import metrics
+from .cache import token_cache, user_cache
+from .models import TokenUser, User
+from .revocation import revoked_tokens, token_id
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -66,27 +70,52 @@ class JWTAuthentication(authentication.BaseAuthentication):
         # By now, we are sure there is a *chance* that authentication will
         # succeed. We delegate the actual credentials authentication to the
         # method below.
-        return self._authenticate_credentials(request, token)
+        with metrics.timer('auth'):
+            return self._authenticate_credentials(request, token)
 
     def _authenticate_credentials(self, request, token):
         """
         Try to authenticate the given credentials. If authentication is
         successful, return the user and token. If not, throw an error.
         """
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY)
-        except:
-            msg = 'Invalid authentication. Could not decode token.'
+        payload = None
+        use_cache = getattr(settings, 'JWT_TOKEN_CACHE', True)
+        if use_cache:
+            key = token_cache.key(token)
+            payload = token_cache.get(key)
+
+        if payload is None:
+            try:
+                payload = jwt.decode(token, settings.SECRET_KEY)
+            except:
+                msg = 'Invalid authentication. Could not decode token.'
+                raise exceptions.AuthenticationFailed(msg)
+            if use_cache:
+                token_cache.set(key, payload)
+
+        if revoked_tokens.is_revoked(token_id(token, payload)):
+            msg = 'This token has been revoked.'
             raise exceptions.AuthenticationFailed(msg)
 
-        try:
-            user = User.objects.get(pk=payload['id'])
-        except User.DoesNotExist:
-            msg = 'No user matching this token was found.'
-            raise exceptions.AuthenticationFailed(msg)
+        if getattr(settings, 'JWT_STATELESS', False) and 'is_staff' in payload:
+            # A stateless token has all the user needs, see `User._generate_jwt_token`.
+            user = TokenUser(payload)
+        else:
+            user = self._get_user(payload)
 
         if not user.is_active:
             msg = 'This user has been deactivated.'
             raise exceptions.AuthenticationFailed(msg)
 
-        return (user, token)
\ No newline at end of file
+        return (user, token)
+
+    def _get_user(self, payload):
+        user = user_cache.get(payload['id'])
+        if user is None:
+            try:
+                user = User.objects.get(pk=payload['id'])
+            except User.DoesNotExist:
+                msg = 'No user matching this token was found.'
+                raise exceptions.AuthenticationFailed(msg)
+            user_cache.set(user.pk, user)
+        return user
\ No newline at end of file
@@ -0,0 +1,122 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class UserCache:
+    """Bounded LRU cache of users with a time to live.
+
+    Users are removed by signals when they are saved or deleted, so
+    a deactivated user is rejected at once in this process. Other
+    processes see the change after `ttl` seconds at the latest.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        """Returns a copy of the cached user or None."""
+        with self._lock:
+            item = self._users.get(pk)
+            if item is not None and item[0] > time.monotonic():
+                self._users.move_to_end(pk)
+                self.hits += 1
+                return copy.copy(item[1])
+            self._users.pop(pk, None)
+            self.misses += 1
+            return None
+
+    def set(self, pk, user):
+        with self._lock:
+            self._users[pk] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._users.move_to_end(pk)
+            if len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._users.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class TokenCache:
+    """Bounded LRU cache of payloads of verified tokens.
+
+    Tokens are keyed by their SHA-256 digest, so the cache does not keep
+    the tokens themselves. A payload is returned only before its `exp`,
+    tokens without `exp` are not cached.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key):
+        """Returns the payload of the token or None."""
+        with self._lock:
+            item = self._payloads.get(key)
+            if item is not None and item[0] > time.time():
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self._payloads.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, payload):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._payloads[key] = (exp, payload)
+            self._payloads.move_to_end(key)
+            if len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+user_cache = UserCache(
+    max_size=getattr(settings, 'JWT_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+)
+
+token_cache = TokenCache(max_size=getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 1024))
+
+
+def collect_metrics():
+    """Counters of the caches for `questionnaire.metrics`."""
+    yield ('questionnaire_jwt_user_cache_hits_total', 'counter',
+           'Users found in the cache.', user_cache.hits)
+    yield ('questionnaire_jwt_user_cache_misses_total', 'counter',
+           'Users loaded from the database.', user_cache.misses)
+    yield ('questionnaire_jwt_token_cache_hits_total', 'counter',
+           'Tokens whose verified payload was found in the cache.', token_cache.hits)
+    yield ('questionnaire_jwt_token_cache_misses_total', 'counter',
+           'Tokens verified by their signature.', token_cache.misses)
+    lookups = token_cache.hits + token_cache.misses
+    yield ('questionnaire_jwt_token_cache_hit_ratio', 'gauge',
+           'Share of tokens found in the cache.', token_cache.hits / lookups if lookups else 0)
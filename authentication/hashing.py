@@ -0,0 +1,115 @@
+"""Password hashing outside of the threads that handle requests.
+
+PBKDF2 takes a lot of processor time on purpose. The asynchronous login and
+registration views hash passwords in a small pool of threads of its own,
+so a burst of logins waits in the queue of the pool instead of holding the
+workers that serve the questionnaires. AUTH_HASHING_WORKERS sets the number
+of threads, AUTH_HASHING_QUEUE_SIZE the number of passwords that may wait;
+above it the request is refused with 429.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+from .models import User
+
+
+class HashingPool:
+    """Bounded pool of threads for password hashing with counters of its queue."""
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password-hashing')
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args):
+        """Calling `func` in the pool, raises Throttled when the queue is full."""
+        with self._lock:
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise Throttled(wait=1, detail='Too many logins at the moment, try again later.')
+            self.waiting += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, time.perf_counter(),
+                                          func, args)
+
+    def _call(self, queued, func, args):
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            self.wait_seconds += time.perf_counter() - queued
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+
+pool = HashingPool(
+    workers=getattr(settings, 'AUTH_HASHING_WORKERS', 2),
+    queue_size=getattr(settings, 'AUTH_HASHING_QUEUE_SIZE', 32),
+)
+
+
+async def make_password(password):
+    return await pool.run(hashers.make_password, password)
+
+
+def _check_password(password, encoded):
+    """Checks the password and returns the new hash if the hasher has changed."""
+    new_encoded = []
+    correct = hashers.check_password(
+        password, encoded, setter=lambda raw: new_encoded.append(hashers.make_password(raw)))
+    return correct, new_encoded[0] if new_encoded else None
+
+
+def _get_user(email):
+    try:
+        return User._default_manager.get_by_natural_key(email)
+    except User.DoesNotExist:
+        return None
+
+
+async def authenticate(email, password):
+    """Asynchronous `django.contrib.auth.authenticate` with the ModelBackend.
+
+    Returns the active user with this email and password or None.
+    """
+    user = await sync_to_async(_get_user)(email)
+    if user is None:
+        # Hashing anyway, so that the time does not tell whether the user exists.
+        await make_password(password)
+        return None
+
+    correct, new_encoded = await pool.run(_check_password, password, user.password)
+    if correct and new_encoded:
+        user.password = new_encoded
+        await sync_to_async(user.save)(update_fields=['password'])
+    return user if correct and user.is_active else None
+
+
+def collect_metrics():
+    """Counters of the hashing pool for `questionnaire.metrics`."""
+    yield ('questionnaire_password_hashing_queue_depth', 'gauge',
+           'Passwords waiting for a thread of the hashing pool.', pool.waiting)
+    yield ('questionnaire_password_hashing_active', 'gauge',
+           'Passwords being hashed.', pool.active)
+    yield ('questionnaire_password_hashing_completed_total', 'counter',
+           'Passwords hashed or checked.', pool.completed)
+    yield ('questionnaire_password_hashing_rejected_total', 'counter',
+           'Logins and registrations refused because the queue was full.', pool.rejected)
+    yield ('questionnaire_password_hashing_wait_seconds_total', 'counter',
+           'Time passwords waited in the queue.', pool.wait_seconds)
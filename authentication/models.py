@@ -1,4 +1,5 @@
 import jwt
+import uuid
 
 from datetime import datetime
 from datetime import timedelta
@@ -16,7 +17,8 @@ class UserManager(BaseUserManager):
 
     By inheriting from BaseUserManager, used by Django to create `User`.
     """
-    def _create_user(self, username, email, password=None, **extra_fields):
+    def _create_user(self, username, email, password=None, password_hash=None,
+                     **extra_fields):
         if not username:
             raise ValueError('The specified username must be set.')
 
@@ -25,7 +27,11 @@ class UserManager(BaseUserManager):
 
         email = self.normalize_email(email)
         user = self.model(username=username, email=email, **extra_fields)
-        user.set_password(password)
+        if password_hash is None:
+            user.set_password(password)
+        else:
+            # The password was already hashed outside of the request thread.
+            user.password = password_hash
         user.save(using=self._db)
 
         return user
@@ -107,11 +113,51 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Creates a JSON web token that stores an ID
          this user and its validity period
          is 60 days in the future.
+         In the stateless mode (JWT_STATELESS) the token also stores
+         `is_staff` and `is_active` and is valid for JWT_STATELESS_TTL seconds.
          """
-        dt = datetime.now() + timedelta(days=60)
-        token = jwt.encode({
-            'id': self.pk,
-            'exp': int(dt.strftime('%s'))
-        }, settings.SECRET_KEY, algorithm='HS256')
+        # `jti` identifies the token for revocation, see `RevokedToken`.
+        payload = {'id': self.pk, 'jti': uuid.uuid4().hex}
+        if getattr(settings, 'JWT_STATELESS', False):
+            dt = datetime.now() + timedelta(seconds=settings.JWT_STATELESS_TTL)
+            payload['is_staff'] = self.is_staff
+            payload['is_active'] = self.is_active
+        else:
+            dt = datetime.now() + timedelta(days=60)
+        payload['exp'] = int(dt.strftime('%s'))
+        token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
 
         return token.decode('utf-8')
+
+
+class TokenUser:
+    """User built from the claims of a stateless token without the database.
+
+    It has only the fields the permissions need.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_superuser = False
+
+    def __init__(self, payload):
+        self.pk = self.id = payload['id']
+        self.is_staff = payload['is_staff']
+        self.is_active = payload['is_active']
+
+    def __str__(self):
+        return f'TokenUser {self.pk}'
+
+
+class RevokedToken(models.Model):
+    """Token revoked before its expiry, by logout or by an administrator.
+
+    Tokens without `jti` are identified by the SHA-256 of the token.
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='revoked_tokens')
+    expires = models.DateTimeField()
+    revoked = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
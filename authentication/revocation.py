@@ -0,0 +1,156 @@
+"""Revocation of tokens.
+
+Revoked tokens are stored in `RevokedToken`. Every process keeps a Bloom
+filter of their IDs and adds the tokens revoked since the last refresh every
+JWT_REVOCATION_REFRESH_SECONDS, so a token that was never revoked is
+accepted without a query. Only tokens found in the filter are checked in the
+table, the filter has false positives but no false negatives.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from .models import RevokedToken
+
+# Revocations are read from the primary database, a replica may be behind.
+DATABASE = 'default'
+
+FALSE_POSITIVE_RATE = 0.001
+
+# Overlap of refreshes, so that a revocation committed late is not missed.
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Set of strings with false positives at the rate `error_rate` up to `capacity` items."""
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        """More items than the capacity, the rate of false positives is higher."""
+        return self.count > self.capacity
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+def token_id(token, payload):
+    """ID of the token in `RevokedToken`."""
+    return payload.get('jti') or hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationList:
+    """Revoked tokens of the process: the Bloom filter and its counters."""
+    def __init__(self, capacity, refresh_seconds):
+        self.capacity = capacity
+        self.refresh_seconds = refresh_seconds
+        self.lookups = 0
+        self.confirmed = 0
+        self.false_positives = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Emptying the filter, it is loaded again on the next check."""
+        with self._lock:
+            self._filter = BloomFilter(self.capacity)
+            self._refreshed = None
+            self._checked = -math.inf
+
+    def refresh(self, force=False):
+        """Adding the tokens revoked since the last refresh to the filter."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_seconds:
+            return
+        with self._lock:
+            if not force and now - self._checked < self.refresh_seconds:
+                return
+            self._checked = now
+            started = datetime.now(timezone.utc)
+            if self._refreshed is None or self._filter.full:
+                self._filter = self._build(started)
+            else:
+                for jti in RevokedToken.objects.using(DATABASE).filter(
+                        revoked__gte=self._refreshed - REFRESH_OVERLAP).values_list(
+                        'jti', flat=True).iterator():
+                    if jti not in self._filter:
+                        self._filter.add(jti)
+            self._refreshed = started
+
+    def _build(self, now):
+        """New filter of the tokens that have not expired, large enough for all of them.
+
+        The old filter is used by other threads until the new one is complete.
+        """
+        jtis = list(RevokedToken.objects.using(DATABASE).filter(
+            expires__gt=now).values_list('jti', flat=True))
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom
+
+    def add(self, jti):
+        with self._lock:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        """Checks the filter and confirms its hits by the table."""
+        self.refresh()
+        self.lookups += 1
+        bloom = self._filter
+        # An overfull filter is not trusted until it is built again, the table is checked.
+        if not bloom.full and jti not in bloom:
+            return False
+        if RevokedToken.objects.using(DATABASE).filter(jti=jti).exists():
+            self.confirmed += 1
+            return True
+        self.false_positives += 1
+        return False
+
+
+revoked_tokens = RevocationList(
+    capacity=getattr(settings, 'JWT_REVOCATION_FILTER_CAPACITY', 100000),
+    refresh_seconds=getattr(settings, 'JWT_REVOCATION_REFRESH_SECONDS', 5),
+)
+
+
+def revoke(token, payload):
+    """Revoking the token until its expiry, the expired revocations are deleted."""
+    jti = token_id(token, payload)
+    now = datetime.now(timezone.utc)
+    RevokedToken.objects.using(DATABASE).filter(expires__lte=now).delete()
+    RevokedToken.objects.using(DATABASE).get_or_create(jti=jti, defaults={
+        'user_id': payload['id'],
+        'expires': datetime.fromtimestamp(payload.get('exp', 0), timezone.utc),
+    })
+    revoked_tokens.add(jti)
+
+
+def collect_metrics():
+    """Counters of the revocation filter for `questionnaire.metrics`."""
+    yield ('questionnaire_jwt_revocation_lookups_total', 'counter',
+           'Tokens checked in the revocation filter.', revoked_tokens.lookups)
+    yield ('questionnaire_jwt_revocation_confirmed_total', 'counter',
+           'Revoked tokens confirmed by the table.', revoked_tokens.confirmed)
+    yield ('questionnaire_jwt_revocation_false_positives_total', 'counter',
+           'Tokens found in the filter but not in the table.', revoked_tokens.false_positives)
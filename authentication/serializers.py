@@ -1,6 +1,11 @@
+import time
+
+import jwt
+from django.conf import settings
 from django.contrib.auth import authenticate
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
 from .models import User
+from .revocation import revoked_tokens, token_id
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -59,7 +64,11 @@ class LoginSerializer(serializers.Serializer):
                 'A password is required to log in.'
             )
 
-        user = authenticate(username=email, password=password)
+        if 'user' in self.context:
+            # The password was already checked by the asynchronous view.
+            user = self.context['user']
+        else:
+            user = authenticate(username=email, password=password)
 
         if user is None:
             raise serializers.ValidationError(
@@ -74,3 +83,80 @@ class LoginSerializer(serializers.Serializer):
         return {
             'token': user.token,
         }
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    """
+    Renews a token, the user is read from the database again.
+    The token may have expired no more than JWT_REFRESH_WINDOW seconds ago.
+    Returns a new JSON web token.
+    """
+    token = serializers.CharField(max_length=1024)
+
+    def validate(self, data):
+        """
+        Validates the token and the user.
+        """
+        try:
+            payload = jwt.decode(data['token'], settings.SECRET_KEY,
+                                 algorithms=['HS256'], options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            raise serializers.ValidationError(
+                'Invalid authentication. Could not decode token.'
+            )
+
+        if payload.get('exp', 0) + settings.JWT_REFRESH_WINDOW < time.time():
+            raise serializers.ValidationError(
+                'This token has expired too long ago, log in again.'
+            )
+
+        if revoked_tokens.is_revoked(token_id(data['token'], payload)):
+            raise serializers.ValidationError(
+                'This token has been revoked.'
+            )
+
+        user = User.objects.filter(pk=payload.get('id')).first()
+
+        if user is None:
+            raise serializers.ValidationError(
+                'No user matching this token was found.'
+            )
+
+        if not user.is_active:
+            raise serializers.ValidationError(
+                'This user has been deactivated.'
+            )
+
+        return {
+            'token': user.token,
+        }
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """
+    Revokes a token of the user, administrators may revoke any token.
+    """
+    token = serializers.CharField(max_length=1024)
+
+    def validate(self, data):
+        """
+        Validates the token and the right to revoke it.
+        """
+        try:
+            payload = jwt.decode(data['token'], settings.SECRET_KEY,
+                                 algorithms=['HS256'], options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            raise serializers.ValidationError(
+                'Invalid authentication. Could not decode token.'
+            )
+
+        user = self.context['request'].user
+        if payload.get('id') != user.pk and not user.is_staff:
+            raise exceptions.PermissionDenied(
+                'You can revoke only your own tokens.'
+            )
+
+        return {
+            'token': data['token'],
+            'payload': payload,
+        }
@@ -0,0 +1,12 @@
+"""Helpers for the tests of authenticated requests."""
+from .revocation import revoked_tokens
+
+
+def reload_revoked_tokens():
+    """Loading the filter of revoked tokens anew.
+
+    The filter is refreshed on a timer, so a test that counts the queries of
+    authenticated requests loads it before the measured requests.
+    """
+    revoked_tokens.reset()
+    revoked_tokens.refresh()
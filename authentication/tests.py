@@ -1,3 +1,279 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .cache import token_cache, user_cache
+from .hashing import pool
+from .models import RevokedToken, TokenUser, User
+from .revocation import BloomFilter, RevocationList, revoked_tokens
+from .testing import reload_revoked_tokens
+
+
+class JWTAuthenticationTest(TestCase):
+    """
+    Test for class JWTAuthentication
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username='admin',
+            email='admin@gmail.com',
+            password='12345678')
+
+    def setUp(self):
+        user_cache.clear()
+        token_cache.clear()
+        reload_revoked_tokens()
+        self.auth_headers = {'HTTP_AUTHORIZATION': 'Bearer ' + self.user.token}
+
+    def test_user_cache(self):
+        """The user is loaded from the database only on the first request."""
+        with self.assertNumQueries(2):
+            self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+
+        self.assertEqual((user_cache.hits, user_cache.misses), (1, 1))
+
+    def test_user_cache_deactivated(self):
+        """A deactivated user is rejected at once."""
+        self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+
+        self.user.is_active = False
+        self.user.save()
+
+        resp = self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+        expected = b'{"detail":"This user has been deactivated."}'
+        self.assertEqual(resp.content, expected)
+
+    def test_token_cache(self):
+        """The signature of a token is verified only on the first request."""
+        with mock.patch('authentication.backends.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual((token_cache.hits, token_cache.misses), (2, 1))
+
+    def test_token_cache_expired(self):
+        """An expired payload is not returned."""
+        key = token_cache.key('token')
+        token_cache.set(key, {'id': self.user.pk, 'exp': int(time.time()) - 1})
+        self.assertIsNone(token_cache.get(key))
+
+        token_cache.set(key, {'id': self.user.pk})
+        self.assertIsNone(token_cache.get(key))
+
+    @override_settings(JWT_TOKEN_CACHE=False)
+    def test_token_cache_disabled(self):
+        with mock.patch('authentication.backends.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(2):
+                self.client.get(reverse('questionnaire-list'), **self.auth_headers)
+        self.assertEqual(decode.call_count, 2)
+        self.assertEqual(token_cache.misses, 0)
+
+
+@override_settings(JWT_STATELESS=True)
+class StatelessTokenTest(TestCase):
+    """
+    Test for tokens with the claims of the user
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username='admin',
+            email='admin@gmail.com',
+            password='12345678')
+
+    def setUp(self):
+        user_cache.clear()
+        token_cache.clear()
+        reload_revoked_tokens()
+
+    def encode(self, **payload):
+        payload = dict({'id': self.user.pk, 'is_staff': True, 'is_active': True}, **payload)
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256').decode('utf-8')
+
+    def test_claims(self):
+        payload = jwt.decode(self.user.token, settings.SECRET_KEY)
+        self.assertEqual((payload['is_staff'], payload['is_active']), (True, True))
+        self.assertLessEqual(payload['exp'], time.time() + settings.JWT_STATELESS_TTL + 1)
+
+    def test_no_queries(self):
+        """The staff check of a stateless token needs no database."""
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer ' + self.user.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsInstance(resp.wsgi_request.user, TokenUser)
+
+    def test_refresh(self):
+        """An expired token is renewed with the current user from the database."""
+        self.user.is_staff = False
+        self.user.save()
+        token = self.encode(exp=int(time.time()) - 60)
+
+        resp = self.client.post(reverse('token_refresh'), {'token': token},
+                                HTTP_AUTHORIZATION='Bearer ' + token)
+        self.assertEqual(resp.status_code, 200)
+        payload = jwt.decode(resp.data['token'], settings.SECRET_KEY)
+        self.assertEqual((payload['id'], payload['is_staff']), (self.user.pk, False))
+
+    def test_refresh_rejected(self):
+        token = self.encode(exp=int(time.time()) - settings.JWT_REFRESH_WINDOW - 60)
+        resp = self.client.post(reverse('token_refresh'), {'token': token})
+        expected = b'{"non_field_errors":["This token has expired too long ago, log in again."]}'
+        self.assertEqual(resp.content, expected)
+
+        self.user.is_active = False
+        self.user.save()
+        resp = self.client.post(reverse('token_refresh'),
+                                {'token': self.encode(exp=int(time.time()))})
+        expected = b'{"non_field_errors":["This user has been deactivated."]}'
+        self.assertEqual(resp.content, expected)
+
+
+class RevocationTest(TestCase):
+    """
+    Test for logout and revocation of tokens
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@gmail.com',
+            password='12345678')
+        cls.user = User.objects.create_user(
+            username='user',
+            email='user@gmail.com',
+            password='12345678')
+
+    def setUp(self):
+        token_cache.clear()
+        reload_revoked_tokens()
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_over_capacity(self):
+        """Revocations above the capacity of the filter are still rejected."""
+        revocations = RevocationList(capacity=3, refresh_seconds=60)
+        for i in range(5):
+            RevokedToken.objects.create(jti=f'revoked-{i}', user=self.user,
+                                        expires='2100-01-01T00:00:00Z')
+
+        self.assertTrue(all(revocations.is_revoked(f'revoked-{i}') for i in range(5)))
+        # The filter was built for all of them and is not loaded again.
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked('other'))
+
+        # Tokens revoked in this process overfill the filter, the table is checked.
+        for i in range(5, 12):
+            revocations.add(f'revoked-{i}')
+        with self.assertNumQueries(1):
+            self.assertFalse(revocations.is_revoked('other'))
+
+    def test_logout(self):
+        """A revoked token is rejected, other tokens of the user still work."""
+        token, other = self.user.token, self.user.token
+        headers = {'HTTP_AUTHORIZATION': 'Bearer ' + token}
+
+        resp = self.client.post(reverse('user_logout'), **headers)
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(RevokedToken.objects.get().user, self.user)
+
+        resp = self.client.get(reverse('questionnaire-list'), **headers)
+        self.assertEqual(resp.content, b'{"detail":"This token has been revoked."}')
+        resp = self.client.post(reverse('token_refresh'), {'token': token})
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('questionnaire-list'),
+                               HTTP_AUTHORIZATION='Bearer ' + other)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_filter_miss(self):
+        """A token that was never revoked is checked without a query."""
+        RevokedToken.objects.create(jti='revoked', user=self.user,
+                                    expires='2100-01-01T00:00:00Z')
+        revoked_tokens.refresh(force=True)
+        lookups = revoked_tokens.lookups
+
+        headers = {'HTTP_AUTHORIZATION': 'Bearer ' + self.admin.token}
+        with self.assertNumQueries(1):
+            self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(revoked_tokens.lookups, lookups + 1)
+        self.assertTrue(revoked_tokens.is_revoked('revoked'))
+
+    def test_revoke(self):
+        """Users revoke their own tokens, administrators any tokens."""
+        token = self.admin.token
+        resp = self.client.post(reverse('token_revoke'), {'token': token},
+                                HTTP_AUTHORIZATION='Bearer ' + self.user.token)
+        self.assertEqual(resp.content, b'{"detail":"You can revoke only your own tokens."}')
+
+        token = self.user.token
+        resp = self.client.post(reverse('token_revoke'), {'token': token},
+                                HTTP_AUTHORIZATION='Bearer ' + self.admin.token)
+        self.assertEqual(resp.status_code, 204)
+        resp = self.client.get(reverse('questionnaire-list'), HTTP_AUTHORIZATION='Bearer ' + token)
+        self.assertEqual(resp.status_code, 403)
+
+
+class AsyncLoginTest(TestCase):
+    """
+    Test for login and registration with hashing in the pool
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user',
+            email='user@gmail.com',
+            password='12345678')
+
+    def login(self, password):
+        return self.client.post(reverse('user_login'), {
+            'email': 'user@gmail.com', 'password': password})
+
+    def test_login(self):
+        completed = pool.completed
+        resp = self.login('12345678')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.data), {'token'})
+
+        resp = self.login('87654321')
+        expected = b'{"non_field_errors":["A user with this email and password was not found."]}'
+        self.assertEqual(resp.content, expected)
+        self.assertEqual(pool.completed, completed + 2)
+
+    def test_invalid_fields(self):
+        """Invalid fields are rejected without hashing the password."""
+        completed = pool.completed
+        resp = self.client.post(reverse('user_login'), {'email': 'user'})
+        expected = b'{"email":["Enter a valid email address."],' \
+                   b'"password":["This field is required."]}'
+        self.assertEqual(resp.content, expected)
+        self.assertEqual(pool.completed, completed)
+
+    def test_registration(self):
+        resp = self.client.post(reverse('user_registration'), {
+            'email': 'new@gmail.com', 'username': 'new', 'password': '12345678'})
+        self.assertEqual(resp.status_code, 201)
+        self.assertTrue(User.objects.get(username='new').check_password('12345678'))
+
+    def test_queue_full(self):
+        """Logins above the queue of the pool are refused."""
+        queue_size, pool.queue_size = pool.queue_size, 0
+        try:
+            resp = self.login('12345678')
+        finally:
+            pool.queue_size = queue_size
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '1')
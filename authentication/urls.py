@@ -1,9 +1,15 @@
 from django.urls import re_path, include
 
-from .views import RegistrationAPIView
-from .views import LoginAPIView
+from .views import AsyncRegistrationAPIView
+from .views import AsyncLoginAPIView
+from .views import LogoutAPIView
+from .views import TokenRefreshAPIView
+from .views import TokenRevokeAPIView
 
 urlpatterns = [
-    re_path(r'^registration/?$', RegistrationAPIView.as_view(), name='user_registration'),
-    re_path(r'^login/?$', LoginAPIView.as_view(), name='user_login'),
+    re_path(r'^registration/?$', AsyncRegistrationAPIView.as_view(), name='user_registration'),
+    re_path(r'^login/?$', AsyncLoginAPIView.as_view(), name='user_login'),
+    re_path(r'^refresh/?$', TokenRefreshAPIView.as_view(), name='token_refresh'),
+    re_path(r'^logout/?$', LogoutAPIView.as_view(), name='user_logout'),
+    re_path(r'^revoke/?$', TokenRevokeAPIView.as_view(), name='token_revoke'),
 ]
@@ -1,28 +1,131 @@
+import asyncio
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import classonlymethod
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import hashing, revocation
 from .models import User
 from .serializers import LoginSerializer
 from .serializers import RegistrationSerializer
+from .serializers import TokenRefreshSerializer
+from .serializers import TokenRevokeSerializer
 
-class RegistrationAPIView(APIView):
+class TokenRefreshAPIView(APIView):
     """
-    Registers a new user.
+    Renews a token.
     """
+    # The token is sent in the body, an expired one in the header must not fail the request.
+    authentication_classes = []
     permission_classes = [AllowAny]
-    serializer_class = RegistrationSerializer
+    serializer_class = TokenRefreshSerializer
 
     def post(self, request):
+        """
+        Checks the token and the user.
+        The token is required.
+        Returns a new JSON web token.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
+class LogoutAPIView(APIView):
+    """
+    Logs out the user by revoking the token of the request.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Revokes the token from the Authorization header.
+        """
+        payload = jwt.decode(request.auth, settings.SECRET_KEY)
+        revocation.revoke(request.auth, payload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TokenRevokeAPIView(APIView):
+    """
+    Revokes a token of the user, administrators may revoke any token.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = TokenRevokeSerializer
+
+    def post(self, request):
+        """
+        Revokes the token from the body of the request.
+        The token is required.
+        """
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        revocation.revoke(**serializer.validated_data)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers may be coroutines.
+    Authentication and permissions are checked in the request thread,
+    the parsing, exceptions and rendering are the same as in APIView.
+    """
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Django calls the view in the event loop only if it looks like a coroutine.
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncRegistrationAPIView(AsyncAPIView):
+    """
+    Registers a new user, the password is hashed in `hashing.pool`.
+    """
+    permission_classes = [AllowAny]
+    serializer_class = RegistrationSerializer
+
+    async def post(self, request):
         """
         Creates a new User object.
         Username, email, and password are required.
         Returns a JSON web token.
         """
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        password_hash = await hashing.make_password(serializer.validated_data['password'])
+        await sync_to_async(serializer.save)(password_hash=password_hash)
 
         return Response(
             {
@@ -32,24 +135,23 @@ class RegistrationAPIView(APIView):
         )
 
 
-class LoginAPIView(APIView):
+class AsyncLoginAPIView(AsyncAPIView):
     """
-    Logs in an existing user.
+    Logs in an existing user, the password is checked in `hashing.pool`.
     """
     permission_classes = [AllowAny]
     serializer_class = LoginSerializer
 
-    def post(self, request):
+    async def post(self, request):
         """
         Checks is user exists.
         Email and password are required.
         Returns a JSON web token.
         """
-        # print(request.data)
         serializer = self.serializer_class(data=request.data)
-        # print(serializer)
-        # print(type(serializer))
+        # Errors of the fields are returned before hashing the password.
+        credentials = serializer.to_internal_value(request.data)
+        serializer.context['user'] = await hashing.authenticate(
+            credentials['email'], credentials['password'])
         serializer.is_valid(raise_exception=True)
-        # print(serializer)
-        # print(serializer.data)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,177 @@
+"""Timing of requests.
+
+`ServerTimingMiddleware` creates `RequestMetrics` for each request, the code
+that handles the request adds the time of its phases with `timer`, and the
+queries are counted by `execute_wrapper` of every connection. The time
+is sent in the Server-Timing header and is collected into histograms by
+routes, which are shown in the Prometheus text format by `render`.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+PHASES = ('auth', 'db', 'serialize', 'render', 'total')
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Time of the phases of one request in seconds and the number of queries."""
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.queries = 0
+        self.active = set()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Wrapper of database queries, see `connection.execute_wrapper`."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds['db'] += time.perf_counter() - start
+            self.queries += 1
+
+    def header(self):
+        """Value of the Server-Timing header."""
+        items = []
+        for phase in PHASES:
+            if phase in self.seconds:
+                item = f'{phase};dur={self.seconds[phase] * 1000:.3f}'
+                if phase == 'db':
+                    item += f';desc="{self.queries} queries"'
+                items.append(item)
+        return ', '.join(items)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Wrapper of the queries of all connections, see `install`.
+
+    The query is counted in the request of the current context, which
+    asgiref copies into the threads of `sync_to_async` under ASGI.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute_wrapper(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """Receiver of `connection_created` that adds `execute_wrapper` to the connection."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+@contextmanager
+def collect():
+    """Collecting the metrics of the request handled inside the block."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timer(phase):
+    """Adding the time of the block to the phase of the current request.
+
+    Nested blocks of the same phase are counted once.
+    """
+    metrics = _current.get()
+    if metrics is None or phase in metrics.active:
+        yield
+        return
+    metrics.active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.seconds[phase] += time.perf_counter() - start
+        metrics.active.discard(phase)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+_histograms = {}
+_collectors = []
+_lock = threading.Lock()
+
+
+def observe(route, method, metrics):
+    """Adding the metrics of the finished request to the histograms of the route."""
+    with _lock:
+        for phase, seconds in metrics.seconds.items():
+            key = ('questionnaire_request_seconds', route, method, phase)
+            if key not in _histograms:
+                _histograms[key] = Histogram(SECONDS_BUCKETS)
+            _histograms[key].observe(seconds)
+
+        key = ('questionnaire_request_queries', route, method, None)
+        if key not in _histograms:
+            _histograms[key] = Histogram(QUERIES_BUCKETS)
+        _histograms[key].observe(metrics.queries)
+
+
+def register_collector(collector):
+    """Adding a function that returns tuples (name, type, help, value) for `render`."""
+    _collectors.append(collector)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def render():
+    """Metrics in the Prometheus text format."""
+    lines = [
+        '# HELP questionnaire_request_seconds Time of the phases of requests.',
+        '# TYPE questionnaire_request_seconds histogram',
+    ]
+    with _lock:
+        histograms = sorted(_histograms.items(), key=lambda item: str(item[0]))
+        for (name, route, method, phase), histogram in histograms:
+            if name != 'questionnaire_request_seconds':
+                continue
+            labels = f'route="{route}",method="{method}",phase="{phase}"'
+            lines.extend(histogram.lines(name, labels))
+
+        lines.append('# HELP questionnaire_request_queries Number of database queries of requests.')
+        lines.append('# TYPE questionnaire_request_queries histogram')
+        for (name, route, method, _), histogram in histograms:
+            if name != 'questionnaire_request_queries':
+                continue
+            lines.extend(histogram.lines(name, f'route="{route}",method="{method}"'))
+
+    for collector in _collectors:
+        for name, metric_type, description, value in collector():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+from . import metrics, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class AsyncCapableMiddleware:
+    """Middleware that works in the event loop of ASGI as well.
+
+    Otherwise Django would run the asynchronous views behind it in the
+    thread of the synchronous code and they would block each other.
+    Subclasses wrap the handling of the request in the context manager
+    returned by `around` and change the response in `finish`, which gets
+    the value of the context manager.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.around(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with self.around(request) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+    def around(self, request):
+        return nullcontext()
+
+    def finish(self, request, response, state):
+        return response
+
+
+class ServerTimingMiddleware(AsyncCapableMiddleware):
+    """Measures requests and sends the time in the Server-Timing header.
+
+    The time of database queries is measured by `metrics.execute_wrapper`
+    of all connections, in whatever thread they run, the other phases are
+    added by the code that handles the request.
+    """
+    @contextmanager
+    def around(self, request):
+        with metrics.collect() as request_metrics:
+            start = time.perf_counter()
+            yield request_metrics
+            request_metrics.seconds['total'] = time.perf_counter() - start
+
+    def finish(self, request, response, request_metrics):
+        response['Server-Timing'] = request_metrics.header()
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        metrics.observe(route, request.method, request_metrics)
+        return response
+
+
+class ReadReplicaMiddleware(AsyncCapableMiddleware):
+    """Allows reads from replicas for requests with safe methods.
+
+    After a request that changes data the client gets the cookie
+    'db_pin' and reads from the primary database for DATABASE_PIN_SECONDS,
+    so it sees its own changes while the replicas are behind.
+    """
+    cookie_name = 'db_pin'
+
+    def allows_replicas(self, request):
+        return request.method in SAFE_METHODS and self.cookie_name not in request.COOKIES
+
+    def around(self, request):
+        return routers.replica_reads(self.allows_replicas(request))
+
+    def finish(self, request, response, state):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'DATABASE_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,15 @@
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+from . import metrics
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timer('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedBrowsableAPIRenderer(BrowsableAPIRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timer('render'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,102 @@
+"""Routing of reads to replicas of the database.
+
+`ReadReplicaMiddleware` allows replicas for requests with safe methods,
+`ReplicaRouter` sends reads of such requests to one of the aliases listed
+in DATABASE_REPLICAS, chosen once per request. Everything else, including
+reads of a request that has already written and reads of users and revoked
+tokens, goes to the primary database 'default'.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+# A replica that is behind would still accept a deactivated user or a revoked token.
+PRIMARY_APPS = ('authentication',)
+
+
+
+class _Reads:
+    """Reads of a block: whether replicas are allowed and the replica chosen for them."""
+    __slots__ = ('allowed', 'alias')
+
+    def __init__(self, allowed):
+        self.allowed = allowed
+        self.alias = None
+
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=None)
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """Allowing reads from replicas inside the block.
+
+    All reads of the block go to one replica, chosen at the first read, so
+    that a request does not mix copies refreshed at different times. The
+    state is changed in place, the queries of async views run in a copy of
+    the context.
+    """
+    token = _replica_reads.set(_Reads(allowed))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Chooses a replica for reads, by turns or the least recently used one.
+
+    The strategy is set by DATABASE_REPLICA_STRATEGY:
+    'round_robin' or 'least_recently_used'.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns = {}
+        self._last_used = {}
+
+    @staticmethod
+    def replicas():
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def choose(self, replicas):
+        with self._lock:
+            if getattr(settings, 'DATABASE_REPLICA_STRATEGY', 'round_robin') == \
+                    'least_recently_used':
+                alias = min(replicas, key=lambda name: self._last_used.get(name, 0))
+                self._last_used[alias] = time.monotonic()
+                return alias
+
+            key = tuple(replicas)
+            if key not in self._turns:
+                self._turns = {key: itertools.cycle(replicas)}
+            return next(self._turns[key])
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas()
+        reads = _replica_reads.get()
+        if replicas and reads and reads.allowed and \
+                model._meta.app_label not in PRIMARY_APPS:
+            if reads.alias is None:
+                reads.alias = self.choose(replicas)
+            return reads.alias
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Reads after a write must see it, so the rest of the request uses the primary.
+        reads = _replica_reads.get()
+        if reads:
+            reads.allowed = False
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary database, see the command sync_replicas.
+        return db not in self.replicas()
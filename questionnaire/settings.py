@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,7 +45,34 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'authentication.User'
 
+# Per-process cache of users found by JWT tokens: number of users and seconds.
+JWT_USER_CACHE_SIZE = 1024
+JWT_USER_CACHE_TTL = 60
+
+# Per-process cache of payloads of verified tokens: switch and number of tokens.
+JWT_TOKEN_CACHE = True
+JWT_TOKEN_CACHE_SIZE = 4096
+
+# Stateless tokens store `is_staff` and `is_active`, so requests do not read
+# the user from the database; they expire in JWT_STATELESS_TTL seconds and are
+# renewed by auth/refresh/ within JWT_REFRESH_WINDOW seconds after the expiry.
+JWT_STATELESS = False
+JWT_STATELESS_TTL = 300
+JWT_REFRESH_WINDOW = 7 * 24 * 3600
+
+# Bloom filter of revoked tokens in every process: number of tokens it holds
+# and seconds between loads of the tokens revoked by other processes.
+JWT_REVOCATION_FILTER_CAPACITY = 100000
+JWT_REVOCATION_REFRESH_SECONDS = 5
+
+# Pool of threads for password hashing at login and registration:
+# number of threads and of passwords waiting for them.
+AUTH_HASHING_WORKERS = 2
+AUTH_HASHING_QUEUE_SIZE = 32
+
 MIDDLEWARE = [
+    'questionnaire.middleware.ServerTimingMiddleware',
+    'questionnaire.middleware.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +113,53 @@ DATABASES = {
     }
 }
 
+# Read replicas: paths of copies of the database separated by commas in the
+# environment variable QUESTIONNAIRE_REPLICAS. SQLite copies are refreshed
+# with the command sync_replicas.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('QUESTIONNAIRE_REPLICAS', '').split(','))):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+# 'round_robin' or 'least_recently_used'.
+DATABASE_REPLICA_STRATEGY = 'round_robin'
+# Seconds during which a client reads from the primary after changing data.
+DATABASE_PIN_SECONDS = 5
+
+# Shards of user answers: paths of SQLite files separated by commas in the
+# environment variable QUESTIONNAIRE_ANSWER_SHARDS. The first shard is always
+# the main database, see questionnaire_api.sharding and the command reshard.
+ANSWER_SHARDS = ['default']
+for number, path in enumerate(
+        filter(None, os.environ.get('QUESTIONNAIRE_ANSWER_SHARDS', '').split(',')), start=1):
+    DATABASES[f'answers_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+    }
+    ANSWER_SHARDS.append(f'answers_{number}')
+
+DATABASE_ROUTERS = [
+    'questionnaire_api.sharding.ShardRouter',
+    'questionnaire.routers.ReplicaRouter',
+]
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The local memory cache is not shared between processes, use a shared
+# backend (for example Memcached) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -130,5 +205,30 @@ REST_FRAMEWORK = {
     #     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'authentication.backends.JWTAuthentication',
-        )
+        ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'questionnaire.renderers.TimedJSONRenderer',
+        'questionnaire.renderers.TimedBrowsableAPIRenderer',
+        ),
+    'DEFAULT_PAGINATION_CLASS': 'questionnaire_api.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 1000,
+    # Limits of requests that change data, see questionnaire_api.throttling.
+    'DEFAULT_THROTTLE_RATES': {
+        'answer_user': '10/second',
+        'answer_ip': '100/second',
+    },
+    'MAX_CONCURRENT_WRITES': 16,
+}
+
+# Saving of user answers: 'sync' writes every answer at once, 'buffered'
+# queues answers in the process and writes them in batches of BATCH_SIZE
+# or every FLUSH_INTERVAL seconds. When QUEUE_SIZE answers are waiting,
+# new answers are refused after PUT_TIMEOUT seconds.
+ANSWER_INGESTION = {
+    'MODE': 'sync',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'QUEUE_SIZE': 10000,
+    'PUT_TIMEOUT': 0.1,
 }
@@ -0,0 +1,17 @@
+"""
+Django settings for the tests of questionnaire project.
+
+python manage.py test --settings=questionnaire.settings_test
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import ANSWER_SHARDS, BASE_DIR, DATABASES
+
+# The tests run with a second shard, so that they cover the answers split
+# between databases. SQLite creates its test database in memory.
+if len(ANSWER_SHARDS) == 1:
+    DATABASES['answers_1'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'answers_1.sqlite3',
+    }
+    ANSWER_SHARDS.append('answers_1')
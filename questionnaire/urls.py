@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from .views import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('questionnaire_api.urls')),
     path('auth/', include('authentication.urls')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1 @@
+default_app_config = 'questionnaire_api.apps.QuestionnaireApiConfig'
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (
-    Answer, AnsewrUser, Question, Questionnaire
+    Answer, AnswerResult, AnsewrUser, Question, QuestionResult, Questionnaire
 )
 
 
@@ -9,3 +9,5 @@ admin.site.register(Answer)
 admin.site.register(AnsewrUser)
 admin.site.register(Question)
 admin.site.register(Questionnaire)
+admin.site.register(AnswerResult)
+admin.site.register(QuestionResult)
@@ -0,0 +1,103 @@
+from itertools import chain
+
+import numpy as np
+from django.db import connections
+
+from . import sharding
+from .models import Answer, AnsewrUser
+
+
+def _choices(alias, question_id):
+    """Array of pairs (user ID, answer option ID) of the choices of the question in one shard.
+
+    The rows of the cursor are read straight into the array
+    without creating the rows of the queryset.
+    """
+    queryset = sharding.using(AnsewrUser.choice_answer.through.objects.filter(
+        ansewruser__question_id=question_id), alias).values_list(
+        'ansewruser__user_id', 'answer_id')
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        values = np.fromiter(chain.from_iterable(cursor), dtype=np.int64)
+    return values.reshape(-1, 2)
+
+
+def _positions(ids, values):
+    """Positions of `values` in the sorted array `ids` and the mask of the found ones."""
+    if not len(ids):
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+    return positions, ids[positions] == values
+
+
+def _one_hot(choices, users, options):
+    """Matrix users x options with 1 where the user chose the option.
+
+    The options are read before the choices, so the choices of an option
+    added in between are skipped as well as the choices of other users.
+    """
+    rows, user_found = _positions(users, choices[:, 0])
+    columns, option_found = _positions(options, choices[:, 1])
+    found = user_found & option_found
+    matrix = np.zeros((len(users), len(options)), dtype=np.int32)
+    matrix[rows[found], columns[found]] = 1
+    return matrix
+
+
+def _options(question_id):
+    return list(Answer.objects.filter(question_id=question_id).order_by(
+        'id').values('id', 'text'))
+
+
+def crosstab(rows_question_id, columns_question_id):
+    """Contingency table of the choices of two questions by the same users.
+
+    The choices are loaded as integer arrays and joined on the user ID,
+    the table is the product of the one-hot matrices of both questions.
+    A user who chose several options is counted in each pair of them.
+    All answers of a user are in one shard, so the tables of the shards are summed.
+    Returns the counts, the marginals and the chi-square statistic of independence.
+    """
+    rows, columns = _options(rows_question_id), _options(columns_question_id)
+    row_ids = np.array([option['id'] for option in rows], dtype=np.int64)
+    column_ids = np.array([option['id'] for option in columns], dtype=np.int64)
+
+    counts = np.zeros((len(rows), len(columns)), dtype=np.int64)
+    respondents = 0
+    for alias in sharding.shards():
+        row_choices = _choices(alias, rows_question_id)
+        column_choices = row_choices if columns_question_id == rows_question_id \
+            else _choices(alias, columns_question_id)
+        users = np.intersect1d(row_choices[:, 0], column_choices[:, 0])
+        respondents += len(users)
+        counts += (_one_hot(row_choices, users, row_ids).T
+                   @ _one_hot(column_choices, users, column_ids))
+
+    row_totals, column_totals = counts.sum(axis=1), counts.sum(axis=0)
+    total = int(counts.sum())
+    chi_square, degrees_of_freedom = 0.0, 0
+    if total:
+        expected = np.outer(row_totals, column_totals) / total
+        nonzero = expected > 0
+        chi_square = float(((counts[nonzero] - expected[nonzero]) ** 2 / expected[nonzero]).sum())
+        degrees_of_freedom = max(0, (np.count_nonzero(row_totals) - 1)
+                                 * (np.count_nonzero(column_totals) - 1))
+
+    return {
+        'rows': {
+            'question': rows_question_id,
+            'answers': [dict(option, count=int(count))
+                        for option, count in zip(rows, row_totals)],
+        },
+        'columns': {
+            'question': columns_question_id,
+            'answers': [dict(option, count=int(count))
+                        for option, count in zip(columns, column_totals)],
+        },
+        'counts': counts.tolist(),
+        'total': total,
+        'respondents': respondents,
+        'chi_square': chi_square,
+        'degrees_of_freedom': degrees_of_freedom,
+    }
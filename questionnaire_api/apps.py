@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class QuestionnaireApiConfig(AppConfig):
     name = 'questionnaire_api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from questionnaire import metrics
+        from . import signals  # noqa: F401
+
+        connection_created.connect(metrics.install)
@@ -0,0 +1,205 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import cache, results, sharding, validation
+from .models import Answer, AnswerResult, AnsewrUser, Question, QuestionResult, Questionnaire
+
+
+def create_user_answers(answers):
+    """Creating user answers together with the selected answer options.
+
+    `answers` is a list of dicts with the keys 'user_id', 'question_id',
+    'text_answer' and 'choice_answer' (list of Answer IDs). The rows are
+    written with two bulk inserts in each shard of the users, so the number
+    of queries does not depend on the number of answers. Must be called
+    inside a transaction. Bulk inserts do not send signals, so the result
+    counters are updated here.
+
+    A user can answer a question only once, so the IDs assigned by the
+    database are looked up by the pair (user_id, question_id).
+    Returns the created answers in the format of AnswerUserSerializer.
+    """
+    created_ids = {}
+    for alias, shard_answers in sharding.group_by_shard(answers).items():
+        # The main database is in the transaction of the caller.
+        with transaction.atomic(using=alias, savepoint=alias != sharding.PRIMARY):
+            created_ids.update(_create_in_shard(alias, shard_answers))
+
+    result = []
+    for answer in answers:
+        result.append({
+            'id': created_ids[(answer['user_id'], answer['question_id'])],
+            'user_id': answer['user_id'],
+            'question': answer['question_id'],
+            'text_answer': answer['text_answer'],
+            'choice_answer': list(answer['choice_answer']),
+        })
+    results.count_answers(
+        [answer['question_id'] for answer in answers],
+        [answer_id for answer in answers for answer_id in answer['choice_answer']],
+    )
+
+    return result
+
+
+def _create_in_shard(alias, answers):
+    """Writing the answers of users of one shard, returns their IDs by (user_id, question_id)."""
+    AnsewrUser.objects.using(alias).bulk_create([
+        AnsewrUser(
+            user_id=answer['user_id'],
+            question_id=answer['question_id'],
+            text_answer=answer['text_answer'],
+        )
+        for answer in answers
+    ])
+
+    user_ids = {answer['user_id'] for answer in answers}
+    question_ids = {answer['question_id'] for answer in answers}
+    created_ids = {}
+    for pk, user_id, question_id in AnsewrUser.objects.using(alias).filter(
+            user_id__in=user_ids, question_id__in=question_ids).order_by(
+            'id').values_list('id', 'user_id', 'question_id'):
+        created_ids[(user_id, question_id)] = pk
+
+    through = AnsewrUser.choice_answer.through
+    through.objects.using(alias).bulk_create([
+        through(ansewruser_id=created_ids[(answer['user_id'], answer['question_id'])],
+                answer_id=answer_id)
+        for answer in answers for answer_id in answer['choice_answer']
+    ])
+    return created_ids
+
+
+def get_choices(answers):
+    """The chosen options of user answers by their IDs.
+
+    The links are read with one query in each database of the answers.
+    """
+    through = AnsewrUser.choice_answer.through
+    by_db = defaultdict(list)
+    for answer in answers:
+        by_db[answer._state.db].append(answer.pk)
+
+    choices = defaultdict(list)
+    for alias, ids in by_db.items():
+        for answer_user_id, answer_id in through.objects.using(alias).filter(
+                ansewruser_id__in=ids).order_by('id').values_list(
+                'ansewruser_id', 'answer_id'):
+            choices[answer_user_id].append(answer_id)
+    return choices
+
+
+def set_choices(answer, answer_ids):
+    """Replacing the chosen options of the user answer.
+
+    The links are changed in the database of the answer without the related
+    manager, which would join the answer options from the main database.
+    """
+    through = AnsewrUser.choice_answer.through
+    links = through.objects.using(answer._state.db).filter(ansewruser_id=answer.pk)
+    old_ids = set(links.values_list('answer_id', flat=True))
+    new_ids = set(answer_ids)
+
+    links.filter(answer_id__in=old_ids - new_ids).delete()
+    through.objects.using(answer._state.db).bulk_create([
+        through(ansewruser_id=answer.pk, answer_id=answer_id)
+        for answer_id in new_ids - old_ids
+    ])
+    results.count_answers([], new_ids - old_ids)
+    results.count_answers([], old_ids - new_ids, delta=-1)
+
+
+def _bulk_create(queryset, objs):
+    """Inserting the rows and setting their IDs.
+
+    Backends that do not return the IDs of inserted rows (SQLite) select
+    them with one query: the created rows are the last ones of `queryset`.
+    """
+    queryset.model.objects.bulk_create(objs)
+    if objs and objs[0].pk is None:
+        ids = queryset.order_by('-id').values_list('id', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(ids)):
+            obj.pk = pk
+
+
+def create_questions(questionnaire_id, questions):
+    """Creating the questions of the poll together with their answer options.
+
+    `questions` is a list of dicts with the keys 'question', 'type' and
+    'answers' (list of dicts with the key 'text'), see QuestionTreeSerializer.
+    Questions, options and their result counters are written with bulk
+    inserts, so the number of queries does not depend on their number.
+    Must be called inside a transaction. Bulk inserts do not send signals,
+    so the caches of the poll are reset here.
+    Returns the created questions in the format of QuestionTreeSerializer.
+    """
+    question_objs = [
+        Question(questionnaire_id=questionnaire_id, question=question['question'],
+                 type=question['type'])
+        for question in questions
+    ]
+    _bulk_create(Question.objects.filter(questionnaire_id=questionnaire_id), question_objs)
+
+    answer_objs = [
+        [Answer(question_id=question_obj.pk, text=answer['text'])
+         for answer in question.get('answers', ())]
+        for question, question_obj in zip(questions, question_objs)
+    ]
+    _bulk_create(Answer.objects.filter(question_id__in=[obj.pk for obj in question_objs]),
+                 [obj for objs in answer_objs for obj in objs])
+
+    QuestionResult.objects.bulk_create([
+        QuestionResult(question_id=obj.pk) for obj in question_objs])
+    AnswerResult.objects.bulk_create([
+        AnswerResult(answer_id=obj.pk) for objs in answer_objs for obj in objs])
+
+    cache.invalidate_bundle(questionnaire_id)
+    validation.invalidate(questionnaire_id=questionnaire_id)
+
+    return [{
+        'id': question_obj.pk,
+        'question': question_obj.question,
+        'type': question_obj.type,
+        'answers': [{'id': obj.pk, 'text': obj.text} for obj in objs],
+    } for question_obj, objs in zip(question_objs, answer_objs)]
+
+
+def create_questionnaire(data):
+    """Creating the poll with its questions and answer options, see `create_questions`.
+
+    Returns the poll in the format of QuestionnaireTreeSerializer.
+    """
+    questions = data.pop('questions', [])
+    questionnaire = Questionnaire.objects.create(**data)
+    return {
+        'id': questionnaire.pk,
+        'title': questionnaire.title,
+        'description': questionnaire.description,
+        'date_start': questionnaire.date_start,
+        'date_stop': questionnaire.date_stop,
+        'questions': create_questions(questionnaire.pk, questions),
+    }
+
+
+def clone_questionnaire(questionnaire):
+    """Copying the poll with its questions and answer options.
+
+    The tree is read with two queries and written by `create_questionnaire`.
+    The copy has no dates, so it can be edited.
+    Returns the copy in the format of QuestionnaireTreeSerializer.
+    """
+    answers = defaultdict(list)
+    for question_id, text in Answer.objects.filter(question__questionnaire=questionnaire).order_by(
+            'id').values_list('question_id', 'text'):
+        answers[question_id].append({'text': text})
+
+    return create_questionnaire({
+        'title': questionnaire.title,
+        'description': questionnaire.description,
+        'questions': [
+            {'question': question, 'type': type_, 'answers': answers[pk]}
+            for pk, question, type_ in Question.objects.filter(
+                questionnaire=questionnaire).order_by('id').values_list('id', 'question', 'type')
+        ],
+    })
@@ -0,0 +1,161 @@
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Min, Q
+from rest_framework.renderers import JSONRenderer
+
+from . import validation
+from .models import Answer, Question, Questionnaire
+from .serializers import (
+    QuestionnaireSerializer, answer_values, question_values, questionnaire_values
+)
+
+ACTIVE_KEY = 'questionnaire_api:active:{generation}:{today}'
+ACTIVE_GENERATION_KEY = 'questionnaire_api:active:generation'
+ACTIVE_LOCK_KEY = 'questionnaire_api:active:lock'
+ACTIVE_LOCK_TIMEOUT = 10
+ACTIVE_WAIT_STEP = 0.05
+ACTIVE_MAX_TIMEOUT = 24 * 60 * 60
+
+BUNDLE_KEY = 'questionnaire_api:bundle:{generation}:{pk}:{pk_generation}'
+BUNDLE_GENERATION_KEY = 'questionnaire_api:bundle:generation'
+BUNDLE_PK_GENERATION_KEY = 'questionnaire_api:bundle:{pk}:generation'
+BUNDLE_TIMEOUT = 60 * 60
+
+
+def _active_key(today):
+    generation = cache.get(ACTIVE_GENERATION_KEY, 0)
+    return ACTIVE_KEY.format(generation=generation, today=today.isoformat())
+
+
+def _active_timeout(today):
+    """Number of seconds until the list of active polls can change by itself.
+
+    This is the beginning of the day on which one of the polls starts,
+    or of the day after one of the polls stops.
+    """
+    boundaries = Questionnaire.objects.aggregate(
+        start=Min('date_start', filter=Q(date_start__gt=today)),
+        stop=Min('date_stop', filter=Q(date_stop__gte=today)),
+    )
+    days = [boundaries['start']]
+    if boundaries['stop']:
+        days.append(boundaries['stop'] + timedelta(days=1))
+    days = [day for day in days if day]
+    if not days:
+        return ACTIVE_MAX_TIMEOUT
+
+    boundary = datetime.combine(min(days), datetime.min.time())
+    seconds = (boundary - datetime.now()).total_seconds()
+    return max(1, min(int(seconds), ACTIVE_MAX_TIMEOUT))
+
+
+def _render_active(today):
+    questionnaire = Questionnaire.objects.filter(
+        date_start__lte=today).filter(
+        date_stop__gte=today)
+    rows = questionnaire_values.values(questionnaire)
+    return JSONRenderer().render(questionnaire_values.to_representation(rows))
+
+
+def get_active():
+    """Getting the rendered JSON of the list of active polls.
+
+    The list is cached until any poll is changed or deleted, or until the
+    next date of the start or stop of a poll. Only one process renders the
+    list after it expires, the others wait for the result.
+    """
+    today = date.today()
+    key = _active_key(today)
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    if not cache.add(ACTIVE_LOCK_KEY, True, ACTIVE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + ACTIVE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(ACTIVE_WAIT_STEP)
+            content = cache.get(key)
+            if content is not None:
+                return content
+            if cache.add(ACTIVE_LOCK_KEY, True, ACTIVE_LOCK_TIMEOUT):
+                break
+
+    try:
+        content = _render_active(today)
+        cache.set(key, content, _active_timeout(today))
+    finally:
+        cache.delete(ACTIVE_LOCK_KEY)
+    return content
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def invalidate_active():
+    """Resetting the cached list of active polls."""
+    _incr(ACTIVE_GENERATION_KEY)
+
+
+def _render_bundle(questionnaire):
+    answers = defaultdict(list)
+    for answer in answer_values.to_representation(answer_values.values(
+            Answer.objects.filter(question__questionnaire=questionnaire).order_by('id'))):
+        answers[answer['question_id']].append(answer)
+
+    questions = question_values.to_representation(question_values.values(
+        Question.objects.filter(questionnaire=questionnaire).order_by('id')))
+    for question in questions:
+        question['answers'] = answers[question['id']]
+
+    data = QuestionnaireSerializer(questionnaire).data
+    data['questions'] = questions
+    return JSONRenderer().render(data)
+
+
+def _bundle_generations(pk):
+    pk_key = BUNDLE_PK_GENERATION_KEY.format(pk=pk)
+    generations = cache.get_many([BUNDLE_GENERATION_KEY, pk_key])
+    return generations.get(BUNDLE_GENERATION_KEY, 0), generations.get(pk_key, 0)
+
+
+def get_bundle(pk):
+    """Getting the rendered JSON of the poll with questions and answer options.
+
+    After the start date is specified the poll can no longer be changed,
+    so such bundles are cached for BUNDLE_TIMEOUT seconds or until the poll
+    is edited or deleted. Returns None if there is no such poll.
+    """
+    pk = validation.to_int(pk)
+    if pk is None:
+        return None
+
+    generations = _bundle_generations(pk)
+    key = BUNDLE_KEY.format(generation=generations[0], pk=pk, pk_generation=generations[1])
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    questionnaire = Questionnaire.objects.filter(pk=pk).first()
+    if questionnaire is None:
+        return None
+
+    content = _render_bundle(questionnaire)
+    # The poll could be changed while it was rendered, then the render is stale.
+    if questionnaire.date_start and _bundle_generations(pk) == generations:
+        cache.set(key, content, BUNDLE_TIMEOUT)
+    return content
+
+
+def invalidate_bundle(pk=None):
+    """Resetting the cached bundle of the poll, without `pk` all bundles."""
+    if pk is None:
+        _incr(BUNDLE_GENERATION_KEY)
+    else:
+        _incr(BUNDLE_PK_GENERATION_KEY.format(pk=pk))
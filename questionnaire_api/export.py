@@ -0,0 +1,87 @@
+import csv
+import heapq
+import json
+from collections import defaultdict
+
+from . import sharding
+from .models import Answer, AnsewrUser, Question
+
+CHUNK_SIZE = 2000
+
+CSV_FIELDS = (
+    'id', 'user_id', 'question_id', 'question', 'text_answer', 'choice_answer', 'choice_text'
+)
+
+
+def iter_responses(questionnaire_id, chunk_size=CHUNK_SIZE):
+    """Iterating over all user answers to the survey questions.
+
+    Answers are read in chunks by the primary key from every shard and merged
+    by ID, texts of questions and answer options are taken from dicts loaded
+    once, so the memory does not depend on the number of answers.
+    """
+    questions = dict(Question.objects.filter(
+        questionnaire_id=questionnaire_id).values_list('id', 'question'))
+    options = dict(Answer.objects.filter(
+        question__questionnaire_id=questionnaire_id).values_list('id', 'text'))
+
+    rows = heapq.merge(*(
+        _iter_shard(alias, list(questions), chunk_size) for alias in sharding.shards()
+    ))
+    for pk, user_id, question_id, text_answer, choices in rows:
+        yield {
+            'id': pk,
+            'user_id': user_id,
+            'question_id': question_id,
+            'question': questions[question_id],
+            'text_answer': text_answer,
+            'choice_answer': choices,
+            'choice_text': [options[answer_id] for answer_id in choices],
+        }
+
+
+def _iter_shard(alias, question_ids, chunk_size):
+    """Answers to the questions from one shard ordered by ID, with the chosen options."""
+    answers = sharding.using(AnsewrUser.objects.filter(
+        question_id__in=question_ids).order_by('id'), alias)
+    links = sharding.using(AnsewrUser.choice_answer.through.objects.filter(
+        ansewruser__question_id__in=question_ids).order_by('id'), alias)
+
+    last_id = 0
+    while True:
+        rows = list(answers.filter(id__gt=last_id).values_list(
+            'id', 'user_id', 'question_id', 'text_answer')[:chunk_size])
+        if not rows:
+            return
+
+        choices = defaultdict(list)
+        for answer_user_id, answer_id in links.filter(
+                ansewruser__id__range=(rows[0][0], rows[-1][0])).values_list(
+                'ansewruser_id', 'answer_id'):
+            choices[answer_user_id].append(answer_id)
+
+        for pk, user_id, question_id, text_answer in rows:
+            yield pk, user_id, question_id, text_answer, choices[pk]
+        last_id = rows[-1][0]
+
+
+def iter_ndjson(responses):
+    """Answers in the format of JSON objects separated by new lines."""
+    for response in responses:
+        yield json.dumps(response, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object that returns the written line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(responses):
+    """Answers in the CSV format, lists are joined with semicolons."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for response in responses:
+        response['choice_answer'] = ';'.join(map(str, response['choice_answer']))
+        response['choice_text'] = ';'.join(response['choice_text'])
+        yield writer.writerow([response[field] for field in CSV_FIELDS])
@@ -0,0 +1,197 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+
+from . import sharding
+from .bulk import create_user_answers
+from .models import AnsewrUser
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'sync',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'QUEUE_SIZE': 10000,
+    'PUT_TIMEOUT': 0.1,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'ANSWER_INGESTION', {}).get(name, DEFAULTS[name])
+
+
+class AnswerBuffer:
+    """Queue of user answers that are written to the database in batches.
+
+    A background thread writes a batch when `batch_size` answers are
+    collected or `flush_interval` seconds have passed since the first of
+    them. When the queue holds `max_size` answers, `submit` waits for
+    `put_timeout` seconds and then refuses the answer.
+    """
+    def __init__(self, batch_size, flush_interval, max_size, put_timeout):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.put_timeout = put_timeout
+        self.queued = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def submit(self, answer):
+        """Adding the answer to the queue, returns False if the queue is full.
+
+        `answer` is a dict in the format of `bulk.create_user_answers`.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: len(self._pending) < self.max_size, self.put_timeout):
+                self.rejected += 1
+                return False
+            self._pending.append(answer)
+            self.queued += 1
+            self._condition.notify_all()
+            if not self._stopping and not self.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='answer-buffer', daemon=True)
+                self._thread.start()
+        return True
+
+    def is_alive(self):
+        """Whether the background thread is running, `submit` starts it again if it is not."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def flush(self):
+        """Writing all queued answers in the calling thread."""
+        while True:
+            with self._condition:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self):
+        """Stopping the background thread and writing the remaining answers."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _take(self):
+        batch = self._pending[:self.batch_size]
+        del self._pending[:self.batch_size]
+        self._condition.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = None
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    if not self._pending:
+                        self._condition.wait()
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+                batch = self._take()
+
+            close_old_connections()
+            try:
+                self._write(batch)
+            except Exception:
+                # The thread must outlive any error, otherwise the queue would only grow.
+                self.failed += len(batch)
+                logger.exception('Failed to write a batch of %s answers.', len(batch))
+            finally:
+                connections.close_all()
+
+    def _write(self, batch):
+        try:
+            # The batch can contain answers of users from all shards.
+            with sharding.atomic():
+                self.written += len(create_user_answers(self._unanswered(batch)))
+            return
+        except DatabaseError:
+            logger.exception('Failed to write a batch of %s answers.', len(batch))
+
+        # Writing the answers one by one so that one bad answer
+        # does not discard the whole batch.
+        for answer in batch:
+            try:
+                with transaction.atomic():
+                    self.written += len(create_user_answers(self._unanswered([answer])))
+            except DatabaseError:
+                self.failed += 1
+                logger.exception('Failed to write the answer %s.', answer)
+
+    @staticmethod
+    def _unanswered(batch):
+        """Skipping answers to questions that the user has already answered.
+
+        Such answers could be queued before the previous answer was written.
+        """
+        answered = set()
+        for alias, answers in sharding.group_by_shard(batch).items():
+            answered.update(sharding.using(AnsewrUser.objects.filter(
+                user_id__in={answer['user_id'] for answer in answers},
+                question_id__in={answer['question_id'] for answer in answers},
+            ), alias).values_list('user_id', 'question_id'))
+
+        result = []
+        for answer in batch:
+            key = (answer['user_id'], answer['question_id'])
+            if key in answered:
+                logger.warning('Skipped a repeated answer %s.', answer)
+                continue
+            answered.add(key)
+            result.append(answer)
+        return result
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def is_buffered():
+    return get_setting('MODE') == 'buffered'
+
+
+def get_buffer():
+    """Returns the answer buffer of the process, creating it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = AnswerBuffer(
+                batch_size=get_setting('BATCH_SIZE'),
+                flush_interval=get_setting('FLUSH_INTERVAL'),
+                max_size=get_setting('QUEUE_SIZE'),
+                put_timeout=get_setting('PUT_TIMEOUT'),
+            )
+        return _buffer
+
+
+@atexit.register
+def shutdown():
+    """Writing the queued answers when the process exits."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.stop()
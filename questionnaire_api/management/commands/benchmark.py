@@ -0,0 +1,306 @@
+import json
+import logging
+import re
+import time
+import tracemalloc
+import warnings
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Min
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.http import urlencode
+
+from authentication.models import User
+from questionnaire_api import sharding, throttling
+from questionnaire_api.models import Answer, AnsewrUser, Question, Questionnaire
+
+URLCONFS = ('questionnaire_api.urls', 'authentication.urls')
+
+# Bodies of the requests that change data, by the name of the route and the method.
+# `{question}` and similar are replaced with IDs of existing rows.
+PAYLOADS = {
+    ('questionnaire-list', 'post'): {
+        'title': 'Benchmark', 'description': 'Benchmark poll.'},
+    ('question-list', 'post'): {
+        'questionnaire_id': '{questionnaire}', 'question': 'Benchmark?', 'type': 1},
+    ('answer-list', 'post'): {
+        'question_id': '{choice_question}', 'text': 'Benchmark answer.'},
+    ('answer_user-list', 'post'): {
+        'user_id': '{new_user}', 'question': '{text_question}', 'text_answer': 'Benchmark.'},
+    ('answer_user-bulk', 'post'): {
+        'user_id': '{new_user}', 'questionnaire': '{text_questionnaire}',
+        'answers': [{'question': '{text_question}', 'text_answer': 'Benchmark.'}]},
+    ('user_registration', 'post'): {
+        'email': 'benchmark-new@example.com', 'username': 'benchmark-new',
+        'password': 'benchmark-password'},
+    ('user_login', 'post'): {
+        'email': 'benchmark@example.com', 'password': 'benchmark-password'},
+    ('questionnaire-tree', 'post'): {
+        'title': 'Benchmark', 'description': 'Benchmark poll.', 'questions': [
+            {'question': 'Benchmark?', 'type': 1},
+            {'question': 'Benchmark choice?', 'type': 3,
+             'answers': [{'text': 'First.'}, {'text': 'Second.'}]},
+        ]},
+    ('questionnaire-clone', 'post'): {},
+    ('questionnaire-questions', 'post'): [
+        {'question': 'Benchmark?', 'type': 2, 'answers': [{'text': 'Yes.'}, {'text': 'No.'}]}],
+    ('token_refresh', 'post'): {'token': '{token}'},
+    # The spare token is revoked, the token of the client stays valid for the other routes.
+    ('user_logout', 'post'): {},
+    ('token_revoke', 'post'): {'token': '{spare_token}'},
+    ('questionnaire-detail', 'put'): {
+        'title': 'Benchmark', 'description': 'Benchmark poll.'},
+    ('questionnaire-detail', 'patch'): {'title': 'Benchmark'},
+    ('question-detail', 'put'): {'question': 'Benchmark?', 'type': 1},
+    ('question-detail', 'patch'): {'question': 'Benchmark?'},
+    ('answer-detail', 'put'): {'text': 'Benchmark answer.'},
+    ('answer-detail', 'patch'): {'text': 'Benchmark answer.'},
+    # The user of an answer cannot be changed.
+    ('answer_user-detail', 'put'): {
+        'user_id': '{answer_user_user}', 'question': '{answer_user_question}',
+        'text_answer': 'Benchmark.'},
+    ('answer_user-detail', 'patch'): {'text_answer': 'Benchmark.'},
+}
+
+# Headers of the requests that replace the headers of the client.
+HEADERS = {
+    ('user_logout', 'post'): {'HTTP_AUTHORIZATION': '{spare_authorization}'},
+}
+
+# Query parameters of the requests, by the name of the route and the method.
+PARAMS = {
+    ('questionnaire-crosstab', 'get'): {
+        'rows': '{choice_question}', 'columns': '{choice_question}'},
+    ('answer_user-search', 'get'): {'q': '{search_word}', 'question': '{search_question}'},
+}
+
+# Model whose ID is substituted into the `pk` of the route, by the prefix of the name.
+PK_SOURCES = {
+    'questionnaire': Questionnaire,
+    'question': Question,
+    'answer': Answer,
+}
+
+# Sample IDs for the `pk` of the routes that need a particular row.
+PK_IDS = {
+    'get_user_responses': 'user',
+    'answer_user-get-user-responses': 'user',
+    'questionnaire-crosstab': 'choice_questionnaire',
+    'questionnaire-questions': 'open_questionnaire',
+}
+
+
+def percentile(values, percent):
+    """Percentile by the nearest rank."""
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def min_in_shards(field):
+    """The least value of the field of user answers in all shards."""
+    values = [
+        AnsewrUser.objects.using(alias).aggregate(value=Min(field))['value']
+        for alias in sharding.shards()
+    ]
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def sample_text_answer():
+    """A text answer from any shard, for the search."""
+    for alias in sharding.shards():
+        answer = AnsewrUser.objects.using(alias).exclude(text_answer='').values(
+            'question_id', 'text_answer').first()
+        if answer:
+            return answer
+    return None
+
+
+def sample_answer_user(pk):
+    """The user and the question of the answer of a user from its shard."""
+    for alias in sharding.shards():
+        answer = AnsewrUser.objects.using(alias).filter(pk=pk).values(
+            'user_id', 'question_id').first()
+        if answer:
+            return answer
+    return None
+
+
+def iter_routes():
+    """Iterating over the tuples (name, methods, has pk) of the routes of URLCONFS."""
+    for urlconf in URLCONFS:
+        for pattern in get_resolver(urlconf).url_patterns:
+            if isinstance(pattern, URLResolver) or not pattern.name:
+                continue
+            groups = pattern.pattern.regex.groupindex
+            if pattern.name == 'api-root' or 'format' in groups:
+                continue
+            yield pattern.name, route_methods(pattern), 'pk' in groups
+
+
+def route_methods(pattern: URLPattern):
+    actions = getattr(pattern.callback, 'actions', None)
+    if actions:
+        return sorted(actions)
+    view_class = getattr(pattern.callback, 'view_class', None) or getattr(
+        pattern.callback, 'cls', None)
+    return sorted(
+        method for method in ('get', 'post', 'put', 'patch', 'delete')
+        if hasattr(view_class, method)
+    )
+
+
+def fill(value, ids):
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    if isinstance(value, str) and re.fullmatch(r'\{\w+\}', value):
+        return ids[value[1:-1]]
+    return value
+
+
+class Command(BaseCommand):
+    help = 'Measures the latency, the number of queries and the memory of all routes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Number of requests to each route.')
+        parser.add_argument('--output', help='File for the JSON report, by default stdout.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # Responses with errors are part of the report, not of the log.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        try:
+            # Everything, including the created user, is rolled back at the end.
+            with sharding.atomic(), warnings.catch_warnings():
+                warnings.filterwarnings('ignore', 'Limit for query logging exceeded')
+                report = self.run(options['iterations'])
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        content = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(content + '\n')
+        else:
+            self.stdout.write(content)
+
+    def run(self, iterations):
+        user = User.objects.create_superuser(
+            username='benchmark', email='benchmark@example.com',
+            password='benchmark-password')
+        token = user.token
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        ids = self.sample_ids()
+        spare_token = user.token
+        ids.update(token=token, spare_token=spare_token,
+                   spare_authorization=f'Bearer {spare_token}')
+
+        routes = []
+        for name, methods, has_pk in iter_routes():
+            for method in methods:
+                routes.append(self.measure(client, name, method, has_pk, ids, iterations))
+        return {'iterations': iterations, 'routes': routes}
+
+    @staticmethod
+    def sample_ids():
+        ids = {
+            name: model.objects.aggregate(pk=Min('id'))['pk']
+            for name, model in PK_SOURCES.items()
+        }
+        # Answers are in the shards of users.
+        ids['answer_user'] = min_in_shards('id')
+        answer_user = sample_answer_user(ids['answer_user']) or {}
+        ids['answer_user_user'] = answer_user.get('user_id')
+        ids['answer_user_question'] = answer_user.get('question_id')
+        ids['user'] = min_in_shards('user_id')
+        ids['new_user'] = -1
+        text_question = Question.objects.filter(type=1).values(
+            'id', 'questionnaire_id').first() or {}
+        ids['text_question'] = text_question.get('id')
+        ids['text_questionnaire'] = text_question.get('questionnaire_id')
+        choice_question = Question.objects.filter(type__gt=1).values(
+            'id', 'questionnaire_id').first() or {}
+        ids['choice_question'] = choice_question.get('id')
+        ids['choice_questionnaire'] = choice_question.get('questionnaire_id')
+        ids['open_questionnaire'] = Questionnaire.objects.filter(
+            date_start=None).aggregate(pk=Min('id'))['pk']
+        text_answer = sample_text_answer() or {}
+        ids['search_question'] = text_answer.get('question_id')
+        words = re.findall(r'\w+', text_answer.get('text_answer', ''))
+        ids['search_word'] = max(words, key=len) if words else None
+        return ids
+
+    def measure(self, client, name, method, has_pk, ids, iterations):
+        kwargs = {}
+        if has_pk:
+            kwargs['pk'] = ids.get(PK_IDS.get(name, name.split('-')[0]))
+
+        if method in ('post', 'put', 'patch') and (name, method) not in PAYLOADS:
+            raise CommandError(
+                f'No payload for {method.upper()} {name}, add it to PAYLOADS.')
+        params = fill(PARAMS.get((name, method), {}), ids)
+        headers = fill(HEADERS.get((name, method), {}), ids)
+        if any(value is None for value in [*kwargs.values(), *params.values()]):
+            return {'route': name, 'method': method.upper(), 'skipped': 'no data'}
+
+        path = reverse(name, kwargs=kwargs)
+        if params:
+            path += '?' + urlencode(params)
+        data = ''
+        if (name, method) in PAYLOADS:
+            data = json.dumps(fill(PAYLOADS[name, method], ids))
+
+        def request():
+            # The limits of answers would refuse the repeated requests.
+            throttling.reset()
+            # Every request is rolled back so that all of them see the same data.
+            sids = {alias: transaction.savepoint(using=alias) for alias in sharding.shards()}
+            try:
+                return client.generic(method.upper(), path, data,
+                                      content_type='application/json', **headers)
+            finally:
+                for alias, sid in sids.items():
+                    transaction.savepoint_rollback(sid, using=alias)
+
+        timings, queries = [], []
+        for _ in range(iterations):
+            with ExitStack() as stack:
+                contexts = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in sharding.shards()
+                ]
+                start = time.perf_counter()
+                response = request()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(context.captured_queries) for context in contexts))
+
+        # Memory is measured in a separate request, tracing slows everything down.
+        tracemalloc.start()
+        request()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'route': name,
+            'method': method.upper(),
+            'path': path,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
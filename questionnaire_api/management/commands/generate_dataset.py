@@ -0,0 +1,157 @@
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from questionnaire_api import cache, results, sharding
+from questionnaire_api.models import Answer, AnsewrUser, Question, Questionnaire
+
+
+def next_id(model, using=None):
+    queryset = model.objects.using(using) if using else model.objects
+    return (queryset.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def chunks(objects, size):
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Creates synthetic polls, questions, answer options and user answers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=100,
+                            help='Number of polls.')
+        parser.add_argument('--questions', type=int, default=10,
+                            help='Number of questions in each poll.')
+        parser.add_argument('--options', type=int, default=5,
+                            help='Number of answer options of choice questions.')
+        parser.add_argument('--users', type=int, default=10000,
+                            help='Number of users who answer.')
+        parser.add_argument('--answers', type=int, default=100000,
+                            help='Number of user answers.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of rows in one insert.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with sharding.atomic():
+            questions = self.create_questionnaires(options)
+            self.create_answers(questions, options['users'], options['answers'])
+            results.rebuild()
+
+        cache.invalidate_active()
+        cache.invalidate_bundle()
+
+    def create_questionnaires(self, options):
+        """Creating polls with questions and answer options.
+
+        IDs are set explicitly, so the rows can be linked without reading
+        them back. Returns the list of tuples (question ID, type, option IDs).
+        """
+        questionnaire_id = next_id(Questionnaire)
+        question_id = next_id(Question)
+        answer_id = next_id(Answer)
+        today = date.today()
+
+        questionnaires, questions, answers, result = [], [], [], []
+        for i in range(options['questionnaires']):
+            date_start = today + timedelta(days=self.random.randint(-60, 30))
+            questionnaires.append(Questionnaire(
+                id=questionnaire_id + i,
+                title=f'Poll {questionnaire_id + i}',
+                description=f'Synthetic poll number {questionnaire_id + i}.',
+                date_start=date_start,
+                date_stop=date_start + timedelta(days=self.random.randint(0, 60)),
+            ))
+            for _ in range(options['questions']):
+                type_question = self.random.randint(1, 3)
+                questions.append(Question(
+                    id=question_id,
+                    questionnaire_id=questionnaire_id + i,
+                    question=f'Synthetic question number {question_id}?',
+                    type=type_question,
+                ))
+                option_ids = []
+                if type_question > 1:
+                    for _ in range(options['options']):
+                        answers.append(Answer(
+                            id=answer_id, question_id=question_id,
+                            text=f'Synthetic answer number {answer_id}.',
+                        ))
+                        option_ids.append(answer_id)
+                        answer_id += 1
+                result.append((question_id, type_question, option_ids))
+                question_id += 1
+
+        for model, objects in ((Questionnaire, questionnaires), (Question, questions),
+                               (Answer, answers)):
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+            self.stdout.write(f'Created {len(objects)} {model._meta.verbose_name_plural}.')
+        return result
+
+    def create_answers(self, questions, users, count):
+        """Creating user answers, each user answers a question only once.
+
+        Answers are written to the shards of their users,
+        the IDs are taken from the range of each shard.
+        """
+        if not questions or not users:
+            return
+        count = min(count, users * len(questions))
+        answer_user_ids = {
+            alias: max(next_id(AnsewrUser, alias), sharding.first_id(alias))
+            for alias in sharding.shards()
+        }
+        first_user_id = max(
+            AnsewrUser.objects.using(alias).aggregate(last=Max('user_id'))['last'] or 0
+            for alias in sharding.shards()
+        ) + 1
+        through = AnsewrUser.choice_answer.through
+
+        def generate():
+            for k in range(count):
+                # Users answer the questions in turn starting from different ones.
+                question_id, type_question, option_ids = questions[
+                    (k // users + k % users) % len(questions)]
+                if type_question == 1:
+                    chosen = []
+                elif type_question == 2:
+                    chosen = [self.random.choice(option_ids)]
+                else:
+                    chosen = self.random.sample(
+                        option_ids, self.random.randint(1, len(option_ids)))
+                user_id = first_user_id + k % users
+                alias = sharding.shard_for(user_id)
+                answer_user_ids[alias] += 1
+                yield AnsewrUser(
+                    id=answer_user_ids[alias] - 1,
+                    user_id=user_id,
+                    question_id=question_id,
+                    text_answer=f'Synthetic text answer {k}.' if type_question == 1 else '',
+                ), chosen
+
+        created = 0
+        for chunk in chunks(generate(), self.batch_size):
+            for alias, rows in sharding.group_by_shard(
+                    chunk, lambda row: row[0].user_id).items():
+                AnsewrUser.objects.using(alias).bulk_create(
+                    [answer for answer, _ in rows], batch_size=self.batch_size)
+                through.objects.using(alias).bulk_create([
+                    through(ansewruser_id=answer.id, answer_id=option_id)
+                    for answer, chosen in rows for option_id in chosen
+                ], batch_size=self.batch_size)
+            created += len(chunk)
+            self.stdout.write(f'Created {created} of {count} user answers.')
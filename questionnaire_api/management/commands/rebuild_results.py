@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from questionnaire_api import results
+from questionnaire_api.models import AnswerResult, QuestionResult
+
+
+class Command(BaseCommand):
+    help = 'Recalculates the counters of answers to questions from scratch.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            results.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {QuestionResult.objects.count()} question and '
+            f'{AnswerResult.objects.count()} answer counters.'
+        ))
@@ -0,0 +1,98 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from questionnaire_api import sharding
+from questionnaire_api.models import AnsewrUser
+
+
+class Command(BaseCommand):
+    help = ('Moves user answers to the shards chosen for their users by the current '
+            'ANSWER_SHARDS, after shards are added or removed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', default=[],
+                            help='Alias of a database or path to an SQLite file to move '
+                                 'all answers from, for example a removed shard. '
+                                 'Can be repeated.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Number of answers moved in one transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the answers that must be moved.')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        sources = list(sharding.shards())
+        for source in map(self.get_alias, options['source']):
+            if source not in sources:
+                sources.append(source)
+        for source in sources:
+            moved, kept = self.move_from(source)
+            verb = 'Must be moved' if self.dry_run else 'Moved'
+            self.stdout.write(f'{verb} {moved} answers from {source}.')
+            if kept:
+                self.stderr.write(
+                    f'Kept {len(kept)} answers in {source}, their users already have answers '
+                    f'to the same questions in their shards: {", ".join(map(str, kept))}.')
+
+    @staticmethod
+    def get_alias(source):
+        """The alias of the database `source`, SQLite files are added as new databases."""
+        if source in connections.databases:
+            return source
+        if not os.path.isfile(source):
+            raise CommandError(f'Unknown database {source}.')
+        alias = f'reshard_{len(connections.databases)}'
+        connections.databases[alias] = dict(
+            connections.databases[sharding.PRIMARY], NAME=source)
+        return alias
+
+    def move_from(self, source):
+        """Moving the answers that do not belong to the shard `source`.
+
+        Answers are first written to the new shard and then deleted from the old one,
+        they keep their IDs. An interrupted run can be repeated. An answer whose user
+        already answered the question in the new shard stays in `source`.
+        Returns the number of moved answers and the IDs of the kept ones.
+        """
+        through = AnsewrUser.choice_answer.through
+        moved, kept = 0, []
+        last_id = 0
+        while True:
+            answers = list(AnsewrUser.objects.using(source).filter(
+                id__gt=last_id).order_by('id')[:self.batch_size])
+            if not answers:
+                return moved, kept
+            last_id = answers[-1].id
+
+            targets = sharding.group_by_shard(answers, lambda answer: answer.user_id)
+            targets.pop(source, None)
+            for target, rows in targets.items():
+                if self.dry_run:
+                    moved += len(rows)
+                    continue
+                ids = [answer.id for answer in rows]
+                links = list(through.objects.using(source).filter(ansewruser_id__in=ids))
+
+                with transaction.atomic(using=target):
+                    AnsewrUser.objects.using(target).bulk_create(rows, ignore_conflicts=True)
+                    # The insert of an answer to the same question of the user is ignored,
+                    # only the answers found in the target by ID, user and question are moved.
+                    copied = set(AnsewrUser.objects.using(target).filter(id__in=ids).values_list(
+                        'id', 'user_id', 'question_id'))
+                    ids = {answer.id for answer in rows
+                           if (answer.id, answer.user_id, answer.question_id) in copied}
+                    through.objects.using(target).bulk_create([
+                        through(ansewruser_id=link.ansewruser_id, answer_id=link.answer_id)
+                        for link in links if link.ansewruser_id in ids
+                    ], ignore_conflicts=True)
+                moved += len(ids)
+                kept.extend(answer.id for answer in rows if answer.id not in ids)
+
+                # The counters do not change, so the answers are deleted without signals.
+                with transaction.atomic(using=source):
+                    through.objects.using(source).filter(ansewruser_id__in=ids).delete()
+                    AnsewrUser.objects.using(source).filter(id__in=ids)._raw_delete(source)
@@ -0,0 +1,27 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database to the replicas from DATABASE_REPLICAS.'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas, set the variable QUESTIONNAIRE_REPLICAS.')
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite databases can be copied.')
+
+        source = sqlite3.connect(str(primary['NAME']))
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(str(settings.DATABASES[alias]['NAME']))
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'Copied the database to {alias}.')
+        finally:
+            source.close()
@@ -0,0 +1,52 @@
+# Generated by Django 3.1.4 on 2026-10-18 02:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_results(apps, schema_editor):
+    """Counting the answers that were given before the counters appeared."""
+    db_alias = schema_editor.connection.alias
+    Question = apps.get_model('questionnaire_api', 'Question')
+    Answer = apps.get_model('questionnaire_api', 'Answer')
+    QuestionResult = apps.get_model('questionnaire_api', 'QuestionResult')
+    AnswerResult = apps.get_model('questionnaire_api', 'AnswerResult')
+
+    QuestionResult.objects.using(db_alias).bulk_create(
+        QuestionResult(question_id=pk, count=count)
+        for pk, count in Question.objects.using(db_alias).order_by().annotate(
+            count=Count('ansewruser')).values_list('id', 'count')
+    )
+    AnswerResult.objects.using(db_alias).bulk_create(
+        AnswerResult(answer_id=pk, count=count)
+        for pk, count in Answer.objects.using(db_alias).order_by().annotate(
+            count=Count('ansewruser')).values_list('id', 'count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='questionnaire_api.question')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnswerResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='questionnaire_api.answer')),
+            ],
+        ),
+        migrations.RunPython(fill_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.1.4 on 2026-10-18 02:21
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_repeated_answers(apps, schema_editor):
+    """Leaving only the first answer of the user to each question.
+
+    Repeated answers could be saved before the constraint appeared,
+    after deleting them the result counters are recalculated.
+    """
+    db_alias = schema_editor.connection.alias
+    AnsewrUser = apps.get_model('questionnaire_api', 'AnsewrUser')
+    QuestionResult = apps.get_model('questionnaire_api', 'QuestionResult')
+    AnswerResult = apps.get_model('questionnaire_api', 'AnswerResult')
+    answers = AnsewrUser.objects.using(db_alias)
+
+    repeated = answers.order_by().values('user_id', 'question_id').annotate(
+        first_id=Min('id'), count=Count('id')).filter(count__gt=1)
+    deleted = False
+    for row in list(repeated):
+        answers.filter(user_id=row['user_id'], question_id=row['question_id']).exclude(
+            id=row['first_id']).delete()
+        deleted = True
+    if not deleted:
+        return
+
+    for result in QuestionResult.objects.using(db_alias).annotate(
+            total=Count('question__ansewruser')):
+        result.count = result.total
+        result.save(update_fields=['count'])
+    for result in AnswerResult.objects.using(db_alias).annotate(
+            total=Count('answer__ansewruser')):
+        result.count = result.total
+        result.save(update_fields=['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire_api', '0002_results'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_repeated_answers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='questionnaire',
+            index=models.Index(fields=['date_start', 'date_stop'], name='questionnaire_dates_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ansewruser',
+            constraint=models.UniqueConstraint(fields=('user_id', 'question'), name='unique_user_answer'),
+        ),
+    ]
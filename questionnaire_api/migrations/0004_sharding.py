@@ -0,0 +1,24 @@
+# Generated by Django 3.1.4 on 2026-10-18 02:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire_api', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ansewruser',
+            name='choice_answer',
+            field=models.ManyToManyField(blank=True, db_constraint=False, to='questionnaire_api.Answer'),
+        ),
+        migrations.AlterField(
+            model_name='ansewruser',
+            name='question',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='questionnaire_api.question'),
+        ),
+    ]
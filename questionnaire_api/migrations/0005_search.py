@@ -0,0 +1,69 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:05
+
+from django.db import migrations
+
+# Full-text index of the text answers, see questionnaire_api.search.
+# The triggers are dropped together with the table when a migration remakes
+# it, such migrations must run create_search_index again.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE questionnaire_api_ansewruser_fts USING fts5("
+    "text_answer, content='questionnaire_api_ansewruser', content_rowid='id')",
+
+    "CREATE TRIGGER questionnaire_api_ansewruser_fts_insert "
+    "AFTER INSERT ON questionnaire_api_ansewruser BEGIN "
+    "INSERT INTO questionnaire_api_ansewruser_fts (rowid, text_answer) "
+    "SELECT new.id, new.text_answer WHERE new.text_answer <> ''; END",
+
+    "CREATE TRIGGER questionnaire_api_ansewruser_fts_delete "
+    "AFTER DELETE ON questionnaire_api_ansewruser BEGIN "
+    "INSERT INTO questionnaire_api_ansewruser_fts "
+    "(questionnaire_api_ansewruser_fts, rowid, text_answer) "
+    "SELECT 'delete', old.id, old.text_answer WHERE old.text_answer <> ''; END",
+
+    "CREATE TRIGGER questionnaire_api_ansewruser_fts_update "
+    "AFTER UPDATE OF text_answer ON questionnaire_api_ansewruser BEGIN "
+    "INSERT INTO questionnaire_api_ansewruser_fts "
+    "(questionnaire_api_ansewruser_fts, rowid, text_answer) "
+    "SELECT 'delete', old.id, old.text_answer WHERE old.text_answer <> ''; "
+    "INSERT INTO questionnaire_api_ansewruser_fts (rowid, text_answer) "
+    "SELECT new.id, new.text_answer WHERE new.text_answer <> ''; END",
+
+    # Indexing the existing answers.
+    "INSERT INTO questionnaire_api_ansewruser_fts (rowid, text_answer) "
+    "SELECT id, text_answer FROM questionnaire_api_ansewruser WHERE text_answer <> ''",
+)
+
+DROP_SQL = (
+    "DROP TRIGGER IF EXISTS questionnaire_api_ansewruser_fts_insert",
+    "DROP TRIGGER IF EXISTS questionnaire_api_ansewruser_fts_delete",
+    "DROP TRIGGER IF EXISTS questionnaire_api_ansewruser_fts_update",
+    "DROP TABLE IF EXISTS questionnaire_api_ansewruser_fts",
+)
+
+
+def create_search_index(apps, schema_editor):
+    """Creating the index only in SQLite, other databases have their own search."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL + CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire_api', '0004_sharding'),
+    ]
+
+    operations = [
+        # The hint lets the migration run in the shards of answers too.
+        migrations.RunPython(create_search_index, drop_search_index,
+                             hints={'model_name': 'ansewruser'}),
+    ]
@@ -1,5 +1,43 @@
+import threading
+from contextlib import contextmanager
+
 from django.db import models
 
+# Questions deleted in the thread right now, see `deleting_questions`.
+_deleting = threading.local()
+
+
+@contextmanager
+def deleting_questions(question_ids):
+    """Marking the questions that are deleted together with their answers.
+
+    The counters of these questions are deleted too, so the answers deleted
+    in the cascade do not decrease them, see `signals.remove_answer_result`.
+    """
+    previous = getattr(_deleting, 'question_ids', frozenset())
+    _deleting.question_ids = previous.union(question_ids)
+    try:
+        yield
+    finally:
+        _deleting.question_ids = previous
+
+
+def is_question_deleted(question_id):
+    """This method for checking whether the question is being deleted in the thread."""
+    return question_id in getattr(_deleting, 'question_ids', frozenset())
+
+
+class QuestionnaireQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting_questions(self.values_list('question__id', flat=True)):
+            return super().delete()
+
+
+class QuestionQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting_questions(self.values_list('id', flat=True)):
+            return super().delete()
+
 
 class Questionnaire(models.Model):
     """This class contains polls."""
@@ -8,11 +46,20 @@ class Questionnaire(models.Model):
     date_start = models.DateField(null=True, blank=True)
     date_stop = models.DateField(null=True, blank=True)
 
+    objects = QuestionnaireQuerySet.as_manager()
+
     def __str__(self):
         return self.description
 
+    def delete(self, *args, **kwargs):
+        with deleting_questions(self.question_set.values_list('id', flat=True)):
+            return super().delete(*args, **kwargs)
+
     class Meta:
         ordering = ['-date_start']
+        indexes = [
+            models.Index(fields=['date_start', 'date_stop'], name='questionnaire_dates_idx'),
+        ]
 
 
 class Question(models.Model):
@@ -26,9 +73,15 @@ class Question(models.Model):
     question = models.TextField()
     type = models.IntegerField(choices=TYPE_ANSWER)
 
+    objects = QuestionQuerySet.as_manager()
+
     def __str__(self):
         return self.question
 
+    def delete(self, *args, **kwargs):
+        with deleting_questions([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
 class Answer(models.Model):
     """This class contains answers to questions."""
@@ -42,11 +95,39 @@ class Answer(models.Model):
 class AnsewrUser(models.Model):
     """This class contains user answers to questions."""
     user_id = models.IntegerField()
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # Answers can be stored in other databases than questions,
+    # see questionnaire_api.sharding.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_constraint=False)
     text_answer = models.CharField(max_length=500, blank=True)
-    choice_answer = models.ManyToManyField(Answer, blank=True)
+    choice_answer = models.ManyToManyField(Answer, blank=True, db_constraint=False)
 
     def __str__(self):
         if self.text_answer:
             return self.text_answer
-        return f"{', '.join(map(str, self.choice_answer.all()))}"
+        answer_ids = self.choice_answer.through.objects.using(self._state.db).filter(
+            ansewruser_id=self.pk).values_list('answer_id', flat=True)
+        return f"{', '.join(map(str, Answer.objects.filter(id__in=list(answer_ids))))}"
+
+    class Meta:
+        # The index of the constraint also serves the search of answers by user.
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'question'], name='unique_user_answer'),
+        ]
+
+
+class QuestionResult(models.Model):
+    """This class contains the number of user answers to the question."""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='result')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.question}: {self.count}"
+
+
+class AnswerResult(models.Model):
+    """This class contains how many times the answer option was chosen."""
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, related_name='result')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.answer}: {self.count}"
@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Pagination by the primary key.
+
+    The next page is selected with the condition `id > last id`, so the time
+    and memory per request do not depend on the size of the table.
+    The page size is set by the parameter `page_size`, by default `PAGE_SIZE`
+    and no more than `MAX_PAGE_SIZE` from the REST_FRAMEWORK settings.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE', 1000)
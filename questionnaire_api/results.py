@@ -0,0 +1,77 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+
+from . import sharding
+from .models import Answer, AnswerResult, AnsewrUser, Question, QuestionResult
+
+
+def _update_counters(model, field, counts, create=True):
+    """Adding deltas to the counters of `model`.
+
+    `counts` maps the ID of the question or answer to the delta.
+    Counters with the same delta are updated with one query. Counters are
+    created together with questions and answers, the missing ones are
+    created on the fly unless `create` is False.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in counts.items():
+        if delta:
+            by_delta[delta].append(pk)
+
+    for delta, ids in by_delta.items():
+        lookup = {f'{field}__in': ids}
+        updated = model.objects.filter(**lookup).update(count=F('count') + delta)
+        if updated == len(ids) or not create:
+            continue
+
+        existing = set(model.objects.filter(**lookup).values_list(field, flat=True))
+        missing = [pk for pk in ids if pk not in existing]
+        model.objects.bulk_create(
+            [model(**{field: pk}) for pk in missing], ignore_conflicts=True)
+        model.objects.filter(**{f'{field}__in': missing}).update(
+            count=F('count') + delta)
+
+
+def count_answers(question_ids, answer_ids, delta=1, create=True):
+    """Changing the counters of questions and answer options by `delta`.
+
+    `question_ids` and `answer_ids` may contain repetitions,
+    each of them changes the counter once.
+    """
+    _update_counters(QuestionResult, 'question_id', {
+        pk: count * delta for pk, count in Counter(question_ids).items()
+    }, create)
+    _update_counters(AnswerResult, 'answer_id', {
+        pk: count * delta for pk, count in Counter(answer_ids).items()
+    }, create)
+
+
+def rebuild():
+    """Recalculating all counters from user answers.
+
+    The answers are counted in each shard separately and the counts are summed.
+    Must be called inside a transaction.
+    """
+    question_counts = Counter()
+    answer_counts = Counter()
+    through = AnsewrUser.choice_answer.through
+    for alias in sharding.shards():
+        question_counts.update(dict(sharding.using(AnsewrUser.objects.order_by().values(
+            'question_id').annotate(count=Count('id')), alias).values_list(
+            'question_id', 'count')))
+        answer_counts.update(dict(sharding.using(through.objects.order_by().values(
+            'answer_id').annotate(count=Count('id')), alias).values_list(
+            'answer_id', 'count')))
+
+    QuestionResult.objects.all().delete()
+    AnswerResult.objects.all().delete()
+
+    QuestionResult.objects.bulk_create(
+        QuestionResult(question_id=pk, count=question_counts[pk])
+        for pk in Question.objects.values_list('id', flat=True)
+    )
+    AnswerResult.objects.bulk_create(
+        AnswerResult(answer_id=pk, count=answer_counts[pk])
+        for pk in Answer.objects.values_list('id', flat=True)
+    )
@@ -0,0 +1,97 @@
+"""Full-text search over text answers.
+
+The SQLite FTS5 table questionnaire_api_ansewruser_fts indexes
+`AnsewrUser.text_answer` and is kept up to date by triggers,
+see the migration 0005_search.
+"""
+import heapq
+import html
+import re
+
+from django.db import connections
+
+from . import sharding
+from .models import AnsewrUser
+
+FTS_TABLE = 'questionnaire_api_ansewruser_fts'
+
+SNIPPET_TOKENS = 12
+
+_WORD = re.compile(r'\w+\*?')
+
+# Markers of the found words in the snippet. They are control characters that
+# are not typed in answers, so the text can be escaped before they become tags.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def to_match(text):
+    """FTS5 query that finds answers with all words of `text`.
+
+    Every word is quoted, so the user cannot break the syntax of the query;
+    a word ending with '*' is searched as a prefix.
+    """
+    terms = []
+    for word in _WORD.findall(text or ''):
+        if word.endswith('*'):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return ' '.join(terms)
+
+
+def _search_shard(alias, match, question_ids, limit):
+    connection = connections[alias]
+    table = connection.ops.quote_name(AnsewrUser._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(question_ids))
+    condition = f'{FTS_TABLE} MATCH %s AND a.question_id IN ({placeholders})'
+    params = [match, *question_ids]
+    # CROSS JOIN makes SQLite search the index first and then read only the found
+    # answers, otherwise it checks the match for every answer to the questions.
+    join = f'FROM {FTS_TABLE} CROSS JOIN {table} a ON a.id = {FTS_TABLE}.rowid WHERE {condition}'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) {join}', params)
+        count = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT bm25({FTS_TABLE}), a.id, a.user_id, a.question_id, a.text_answer, "
+            f"snippet({FTS_TABLE}, 0, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS}) "
+            f"{join} ORDER BY bm25({FTS_TABLE}), a.id LIMIT %s",
+            params + [limit],
+        )
+        rows = cursor.fetchall()
+    return count, rows
+
+
+def _highlight(snippet):
+    """The snippet as safe HTML with the found words in <mark>."""
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(text, question_ids, offset=0, limit=20):
+    """Text answers to the questions that contain all words of `text`.
+
+    The answers are ranked by BM25, the best first; each of them has a snippet
+    of the text, escaped as HTML, with the found words in <mark>. Every shard
+    returns its best `offset + limit` answers, and they are merged by the rank.
+    Returns the number of found answers and the answers of the page.
+    """
+    match = to_match(text)
+    if not match or not question_ids:
+        return 0, []
+
+    total, shard_rows = 0, []
+    for alias in sharding.shards():
+        count, rows = _search_shard(alias, match, list(question_ids), offset + limit)
+        total += count
+        shard_rows.append(rows)
+
+    page = list(heapq.merge(*shard_rows))[offset:offset + limit]
+    return total, [{
+        'id': pk,
+        'user_id': user_id,
+        'question': question_id,
+        'text_answer': text_answer,
+        'snippet': _highlight(snippet),
+        # BM25 of SQLite is negative, the better the answer, the less it is.
+        'score': -rank,
+    } for rank, pk, user_id, question_id, text_answer, snippet in page]
@@ -1,29 +1,158 @@
+from django.db import models
 from rest_framework import serializers
 
+from questionnaire import metrics
+from .bulk import get_choices, set_choices
 from .models import (
     Answer, AnsewrUser, Question, Questionnaire
 )
 
 
-class AnswerSerializer(serializers.ModelSerializer):
+class TimedListSerializer(serializers.ListSerializer):
+    """List serializer that adds its time to the metrics of the request."""
+    @property
+    def data(self):
+        with metrics.timer('serialize'):
+            return super().data
+
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    """Model serializer that adds its time to the metrics of the request.
+
+    Subclasses set `list_serializer_class = TimedListSerializer` in Meta
+    to measure lists too.
+    """
+    @property
+    def data(self):
+        with metrics.timer('serialize'):
+            return super().data
+
+
+class AnswerSerializer(TimedModelSerializer):
     class Meta:
         model = Answer
         fields = ('id', 'question_id', 'text')
+        list_serializer_class = TimedListSerializer
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(TimedModelSerializer):
     class Meta:
         model = Question
         fields = ('id', 'question', 'type', 'questionnaire_id')
+        list_serializer_class = TimedListSerializer
 
 
-class QuestionnaireSerializer(serializers.ModelSerializer):
+class QuestionnaireSerializer(TimedModelSerializer):
     class Meta:
         model = Questionnaire
         fields = ('id', 'title', 'description', 'date_start', 'date_stop')
+        list_serializer_class = TimedListSerializer
+
+
+class AnswerTreeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ('id', 'text')
 
 
-class AnswerUserSerializer(serializers.ModelSerializer):
+class QuestionTreeSerializer(serializers.ModelSerializer):
+    """Question with its answer options, see `bulk.create_questions`."""
+    answers = AnswerTreeSerializer(many=True, required=False)
+
+    def validate(self, data):
+        if data['type'] == 1 and data.get('answers'):
+            raise serializers.ValidationError('This type of question requires a text answer.')
+        return data
+
+    class Meta:
+        model = Question
+        fields = ('id', 'question', 'type', 'answers')
+
+
+class QuestionnaireTreeSerializer(serializers.ModelSerializer):
+    """Poll with its questions and their answer options, see `bulk.create_questionnaire`."""
+    questions = QuestionTreeSerializer(many=True, required=False)
+
+    class Meta:
+        model = Questionnaire
+        fields = ('id', 'title', 'description', 'date_start', 'date_stop', 'questions')
+
+
+class ChoiceAnswerField(serializers.ManyRelatedField):
+    """IDs of the chosen options read from the table of links.
+
+    The related manager would join the answer options, which are in another
+    database when the answers are in shards. Lists pass the options of all
+    answers in the context 'choices', see `bulk.get_choices`.
+    """
+    def get_attribute(self, instance):
+        choices = self.context.get('choices')
+        if choices is not None:
+            return choices.get(instance.pk, [])
+        return get_choices([instance])[instance.pk]
+
+    def to_representation(self, iterable):
+        return list(iterable)
+
+
+class AnswerUserSerializer(TimedModelSerializer):
+    choice_answer = ChoiceAnswerField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=Answer.objects.all()),
+        required=False,
+    )
+
+    def validate_user_id(self, value):
+        # The answers of a user are stored in the shard of the user, see `sharding`.
+        if self.instance is not None and value != self.instance.user_id:
+            raise serializers.ValidationError('The user of an answer cannot be changed.')
+        return value
+
+    def update(self, instance, validated_data):
+        choice_answer = validated_data.pop('choice_answer', None)
+        instance = super().update(instance, validated_data)
+        if choice_answer is not None:
+            set_choices(instance, [answer.pk for answer in choice_answer])
+        return instance
+
     class Meta:
         model = AnsewrUser
         fields = ('id', 'user_id', 'question', 'text_answer', 'choice_answer')
+        list_serializer_class = TimedListSerializer
+
+
+class ValuesSerializer:
+    """Read-only serializer of rows selected with `values`.
+
+    Gives the same output as `serializer_class` with many=True for fields that
+    are plain columns, but does not create model instances and DRF fields.
+    The names of the fields and the conversions of their values are
+    prepared once when the serializer is created.
+    """
+    def __init__(self, serializer_class):
+        meta = serializer_class.Meta
+        self.fields = tuple(meta.fields)
+        self.converters = tuple(
+            (name, self._date) for name in self.fields
+            if type(meta.model._meta.get_field(name)) is models.DateField
+        )
+
+    @staticmethod
+    def _date(value):
+        return value.isoformat() if value is not None else None
+
+    def values(self, queryset):
+        """Queryset of dicts with the fields of the serializer."""
+        return queryset.values(*self.fields)
+
+    def to_representation(self, rows):
+        with metrics.timer('serialize'):
+            rows = list(rows)
+            for name, converter in self.converters:
+                for row in rows:
+                    row[name] = converter(row[name])
+            return rows
+
+
+answer_values = ValuesSerializer(AnswerSerializer)
+question_values = ValuesSerializer(QuestionSerializer)
+questionnaire_values = ValuesSerializer(QuestionnaireSerializer)
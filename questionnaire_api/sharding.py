@@ -0,0 +1,211 @@
+"""Sharding of user answers by the user.
+
+User answers (`AnsewrUser` and the links to the chosen answer options) are
+stored in the databases listed in ANSWER_SHARDS, the first of them is always
+the main database 'default'. All answers of a user are in one shard chosen by
+`shard_for`, so creating answers, checking repeated answers and reading the
+answers of a user touch one database. Reads over all users query every shard
+and merge the results by ID.
+
+Polls, questions and answer options stay in the main database, so queries
+to the shards must not join them.
+"""
+import heapq
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import AnsewrUser
+
+PRIMARY = 'default'
+
+# Models stored in the shards, by `model_name`.
+SHARDED_MODELS = ('ansewruser', 'ansewruser_choice_answer')
+
+# IDs of answers created in the shard with the index N start from N * ID_RANGE,
+# so the IDs are unique in all shards, see `reserve_ids`.
+ID_RANGE = 10 ** 12
+
+
+def shards():
+    return getattr(settings, 'ANSWER_SHARDS', [PRIMARY])
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash of the integer `key` into `buckets` buckets.
+
+    When a bucket is added only 1/N of the keys move to it.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(user_id):
+    """The alias of the database with the answers of the user."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return aliases[0]
+    return aliases[jump_hash(int(user_id), len(aliases))]
+
+
+def group_by_shard(items, user_id=lambda item: item['user_id']):
+    """Splitting `items` by shards keeping their order."""
+    groups = defaultdict(list)
+    for item in items:
+        groups[shard_for(user_id(item))].append(item)
+    return groups
+
+
+def using(queryset, alias):
+    """The queryset in the shard `alias`.
+
+    Queries to the main database are left to the routers,
+    so they can be sent to replicas.
+    """
+    return queryset if alias == PRIMARY else queryset.using(alias)
+
+
+@contextmanager
+def atomic(aliases=None):
+    """Transactions in several shards, all shards by default.
+
+    The transactions are committed one by one, they are not atomic together.
+    """
+    with ExitStack() as stack:
+        for alias in aliases or shards():
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def sharded(queryset):
+    """The same query in all shards, see `ShardedQuerySet`."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return using(queryset, aliases[0])
+    return ShardedQuerySet([queryset.using(alias) for alias in aliases])
+
+
+class ShardedQuerySet:
+    """Union of the same query in several shards ordered by one field.
+
+    Supports what the keyset pagination and `get_object` need:
+    `filter`, `order_by`, slicing, iterating, `get` and `count`.
+    The rows of the shards are merged without loading them all.
+    """
+    def __init__(self, querysets, ordering='id'):
+        self.querysets = querysets
+        self.ordering = ordering
+        self.model = querysets[0].model
+
+    def _clone(self, querysets, ordering=None):
+        return ShardedQuerySet(querysets, ordering or self.ordering)
+
+    def all(self):
+        return self._clone([queryset.all() for queryset in self.querysets])
+
+    def filter(self, *args, **kwargs):
+        return self._clone([queryset.filter(*args, **kwargs) for queryset in self.querysets])
+
+    def order_by(self, *fields):
+        ordering = fields[0] if fields else 'id'
+        return self._clone([queryset.order_by(ordering) for queryset in self.querysets],
+                           ordering)
+
+    def _key(self, row):
+        name = self.ordering.lstrip('-')
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def _merge(self, querysets):
+        return heapq.merge(*querysets, key=self._key, reverse=self.ordering.startswith('-'))
+
+    def __iter__(self):
+        return self._merge(queryset.order_by(self.ordering) for queryset in self.querysets)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None or item.step:
+            raise TypeError('Only slices with the end are supported.')
+        start = item.start or 0
+        return list(islice(self._merge(
+            queryset.order_by(self.ordering)[:item.stop] for queryset in self.querysets
+        ), start, item.stop))
+
+    def get(self, *args, **kwargs):
+        for queryset in self.querysets:
+            try:
+                return queryset.get(*args, **kwargs)
+            except self.model.DoesNotExist:
+                continue
+        raise self.model.DoesNotExist(
+            f'{self.model._meta.object_name} matching query does not exist.')
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+
+def first_id(alias):
+    """The first ID of answers created in the shard."""
+    return shards().index(alias) * ID_RANGE + 1
+
+
+def reserve_ids(alias):
+    """Starting the IDs of answers in the shard from its own range.
+
+    Only SQLite shards are supported. Answers keep their IDs when they are
+    moved by the command reshard.
+    """
+    if alias not in shards() or shards().index(alias) == 0:
+        return
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return
+
+    table = AnsewrUser._meta.db_table
+    start = first_id(alias) - 1
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s',
+            [start, table, start],
+        )
+        cursor.execute(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+            [table, start, table],
+        )
+
+
+class ShardRouter:
+    """Sends answers saved or read through model instances to their shard.
+
+    Querysets of answers without an instance go to the main database,
+    the code that works with other shards selects them with `using`.
+    """
+    @staticmethod
+    def _is_sharded(model):
+        return (model._meta.app_label == 'questionnaire_api'
+                and model._meta.model_name in SHARDED_MODELS)
+
+    def _db_for_instance(self, model, instance):
+        if not self._is_sharded(model) or instance is None \
+                or instance._meta.model_name != 'ansewruser':
+            return None
+        alias = instance._state.db or shard_for(instance.user_id)
+        # The main database is left to the next routers.
+        return None if alias == PRIMARY else alias
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_instance(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_instance(model, hints.get('instance'))
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == PRIMARY or db not in shards():
+            return None
+        return app_label == 'questionnaire_api' and model_name in SHARDED_MODELS
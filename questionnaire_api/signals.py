@@ -0,0 +1,173 @@
+import threading
+
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, results, sharding, validation
+from .models import (
+    Answer, AnswerResult, AnsewrUser, Question, QuestionResult, Questionnaire,
+    is_question_deleted,
+)
+
+
+@receiver(post_save, sender=Questionnaire)
+@receiver(post_delete, sender=Questionnaire)
+def reset_active_cache(sender, instance, **kwargs):
+    cache.invalidate_active()
+    cache.invalidate_bundle(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def reset_question_bundle(sender, instance, **kwargs):
+    cache.invalidate_bundle(instance.questionnaire_id)
+    # The question could be moved from another poll.
+    validation.invalidate(question_id=instance.pk)
+    validation.invalidate(questionnaire_id=instance.questionnaire_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def reset_answer_bundles(sender, instance, **kwargs):
+    # Finding the poll of the answer would take a query,
+    # and answers are changed only in polls that have not started.
+    cache.invalidate_bundle()
+    validation.invalidate(question_id=instance.question_id)
+
+
+@receiver(post_save, sender=Question)
+def create_question_result(sender, instance, created, **kwargs):
+    if created:
+        QuestionResult.objects.get_or_create(question_id=instance.pk)
+
+
+@receiver(post_save, sender=Answer)
+def create_answer_result(sender, instance, created, **kwargs):
+    if created:
+        AnswerResult.objects.get_or_create(answer_id=instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def delete_sharded_answers(sender, instance, **kwargs):
+    """Deleting answers to the question from the shards other than the main one.
+
+    The answers in the main database are deleted by the cascade. The counters
+    of the question and its options are deleted with them, so the answers are
+    deleted without signals.
+    """
+    through = AnsewrUser.choice_answer.through
+    for alias in sharding.shards()[1:]:
+        through.objects.using(alias).filter(ansewruser__question_id=instance.pk).delete()
+        AnsewrUser.objects.using(alias).filter(question_id=instance.pk)._raw_delete(alias)
+
+
+@receiver(post_delete, sender=Answer)
+def delete_sharded_choices(sender, instance, **kwargs):
+    """Deleting the choices of the answer option from the shards other than the main one."""
+    through = AnsewrUser.choice_answer.through
+    for alias in sharding.shards()[1:]:
+        through.objects.using(alias).filter(answer_id=instance.pk).delete()
+
+
+@receiver(post_migrate)
+def reserve_answer_ids(sender, using, **kwargs):
+    if sender.name == 'questionnaire_api':
+        sharding.reserve_ids(using)
+
+
+@receiver(pre_save, sender=AnsewrUser)
+def move_answer_result(sender, instance, raw, using, **kwargs):
+    """Moving the counter when the answer is reassigned to another question."""
+    if instance._state.adding or raw:
+        return
+    old_question_id = sender.objects.using(using).filter(
+        pk=instance.pk).values_list('question_id', flat=True).first()
+    if old_question_id is not None and old_question_id != instance.question_id:
+        results.count_answers([old_question_id], [], delta=-1)
+        results.count_answers([instance.question_id], [])
+
+
+@receiver(post_save, sender=AnsewrUser)
+def add_answer_result(sender, instance, created, **kwargs):
+    if created:
+        results.count_answers([instance.question_id], [])
+
+
+# User answers deleted in the thread whose counters are not decreased yet.
+_removed = threading.local()
+
+
+def _removed_answers():
+    if not hasattr(_removed, 'answers'):
+        _removed.answers = {}
+    return _removed.answers
+
+
+@receiver(pre_delete, sender=AnsewrUser)
+def remove_answer_result(sender, instance, using, **kwargs):
+    """Remembering the question and the options of the answer before they are deleted.
+
+    The counters are decreased in `post_delete`, so that the answers deleted
+    together are counted with one query. Django sends `pre_delete` of the
+    answers before the signals of the question or poll deleted with them,
+    so such questions are marked by `models.deleting_questions` beforehand:
+    their counters are deleted anyway and the options are not selected.
+    """
+    if is_question_deleted(instance.question_id):
+        return
+    # The options are selected without a join, they are in another database in shards.
+    _removed_answers()[using, instance.pk] = (
+        instance.question_id,
+        list(sender.choice_answer.through.objects.using(using).filter(
+            ansewruser_id=instance.pk).values_list('answer_id', flat=True)),
+    )
+
+
+@receiver(post_delete, sender=AnsewrUser)
+def count_removed_answers(sender, **kwargs):
+    """Decreasing the counters of all answers deleted together.
+
+    The counters of the questions and options deleted in the same cascade
+    are already gone, they are not created again.
+    """
+    removed = _removed_answers()
+    if not removed:
+        return
+    question_ids, answer_ids = [], []
+    for question_id, choice_ids in removed.values():
+        question_ids.append(question_id)
+        answer_ids.extend(choice_ids)
+    removed.clear()
+    results.count_answers(question_ids, answer_ids, delta=-1, create=False)
+
+
+@receiver(m2m_changed, sender=AnsewrUser.choice_answer.through)
+def change_choice_result(sender, instance, action, reverse, pk_set, **kwargs):
+    """Changing the counters of answer options when the choice of the user changes.
+
+    `pk_set` of 'post_add' contains only really added links, before removing
+    the links that really exist are selected.
+    """
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # `instance` is the answer option, `pk_set` contains user answers.
+        related = instance.ansewruser_set.all()
+        if action == 'post_add':
+            results.count_answers([], [instance.pk] * len(pk_set))
+            return
+        if action == 'pre_remove':
+            related = related.filter(pk__in=pk_set)
+        results.count_answers([], [instance.pk] * related.count(), delta=-1)
+        return
+
+    if action == 'post_add':
+        results.count_answers([], pk_set)
+        return
+    related = instance.choice_answer.all()
+    if action == 'pre_remove':
+        related = related.filter(pk__in=pk_set)
+    results.count_answers([], related.values_list('id', flat=True), delta=-1)
@@ -0,0 +1,16 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class ShardedTestCase(TestCase):
+    """
+    Test case with access to all shards of user answers
+
+    The fixture is loaded only into the main database, it has the answers
+    of a user whose shard is the main one.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('loaddata', 'initial_data.json', database='default', verbosity=0)
@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, override_settings
+
+from questionnaire_api import sharding
+from questionnaire_api.models import (
+    Answer, AnsewrUser, Question, QuestionResult, Questionnaire
+)
+from questionnaire_api.tests.base import ShardedTestCase
+
+
+class GenerateDatasetTest(ShardedTestCase):
+    """
+    Test for the command generate_dataset
+    """
+
+    def test_generate_dataset(self):
+        """Synthetic rows are added to the existing ones."""
+        call_command('generate_dataset', questionnaires=3, questions=4, options=2,
+                     users=5, answers=40, batch_size=7, stdout=StringIO())
+
+        self.assertEqual(Questionnaire.objects.count(), 4 + 3)
+        self.assertEqual(Question.objects.count(), 6 + 3 * 4)
+        self.assertEqual(Answer.objects.filter(question__type=1).count(), 0)
+        self.assertEqual(sharding.sharded(AnsewrUser.objects.all()).count(), 1 + 40)
+
+        choice_question_ids = list(Question.objects.filter(type__gt=1).values_list('id', flat=True))
+        for alias in sharding.shards():
+            answers = AnsewrUser.objects.using(alias)
+            repeated = answers.values('user_id', 'question_id').annotate(
+                count=Count('id')).filter(count__gt=1)
+            self.assertFalse(repeated.exists())
+            choice_answers = answers.filter(question_id__in=choice_question_ids)
+            self.assertFalse(choice_answers.filter(choice_answer=None).exists())
+        self.assertEqual(QuestionResult.objects.aggregate(total=Sum('count'))['total'], 41)
+
+
+class BenchmarkTest(ShardedTestCase):
+    """
+    Test for the command benchmark
+    """
+
+    # The test runner has already set up the test environment.
+    @mock.patch('questionnaire_api.management.commands.benchmark.teardown_test_environment')
+    @mock.patch('questionnaire_api.management.commands.benchmark.setup_test_environment')
+    def test_benchmark(self, *mocks):
+        """Every route of the fixture is measured with a successful response."""
+        stdout = StringIO()
+        call_command('benchmark', iterations=1, stdout=stdout)
+
+        routes = json.loads(stdout.getvalue())['routes']
+        self.assertIn(('answer_user-detail', 'PUT'),
+                      [(route['route'], route['method']) for route in routes])
+        for route in routes:
+            with self.subTest(route=route['route'], method=route['method']):
+                self.assertNotIn('skipped', route)
+                self.assertIn(route['status'], range(200, 300))
+        self.assertFalse(Questionnaire.objects.filter(title='Benchmark').exists())
+
+
+class SyncReplicasTest(SimpleTestCase):
+    """
+    Test for the command sync_replicas
+    """
+
+    def test_sync_replicas(self):
+        """The primary database is copied to the replica file."""
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(primary) as connection:
+                connection.execute('CREATE TABLE poll (title TEXT)')
+                connection.execute("INSERT INTO poll VALUES ('Weather')")
+            connection.close()
+
+            # Only the settings of the command are replaced, the test databases stay.
+            databases = {
+                'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': primary},
+                'replica_0': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': replica},
+            }
+            stdout = StringIO()
+            with mock.patch.dict(settings.DATABASES, databases), \
+                    override_settings(DATABASE_REPLICAS=['replica_0']):
+                call_command('sync_replicas', stdout=stdout)
+
+            self.assertEqual(stdout.getvalue(), 'Copied the database to replica_0.\n')
+            connection = sqlite3.connect(replica)
+            try:
+                self.assertEqual(connection.execute('SELECT title FROM poll').fetchall(),
+                                 [('Weather',)])
+            finally:
+                connection.close()
@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+
+from questionnaire_api.models import AnsewrUser, Questionnaire
+
+
+class IndexUsageTest(TestCase):
+    """
+    Test that the frequent queries use indexes
+    """
+    def assertUsesIndex(self, queryset, table, condition):
+        """Checking that the table is searched by the index with the condition.
+
+        SQLite names the index of a unique constraint by itself,
+        so the index is recognized by the condition of the search.
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        expected = [
+            line for line in plan
+            if line.startswith(f'SEARCH {table} USING') and 'INDEX' in line and condition in line
+        ]
+        self.assertTrue(expected, plan)
+
+    def test_repeated_answer(self):
+        """Checking the repeated answer of the user."""
+        queryset = AnsewrUser.objects.filter(user_id=1, question_id=1).values('id')[:1]
+        self.assertUsesIndex(queryset, 'questionnaire_api_ansewruser',
+                             '(user_id=? AND question_id=?)')
+
+    def test_user_responses(self):
+        """Search for answers of the user."""
+        queryset = AnsewrUser.objects.filter(user_id=1).values_list(
+            'id', 'question__question', 'question__questionnaire__description')
+        self.assertUsesIndex(queryset, 'questionnaire_api_ansewruser', '(user_id=?)')
+
+        through = AnsewrUser.choice_answer.through
+        queryset = through.objects.filter(ansewruser__user_id=1).values_list(
+            'ansewruser_id', 'answer__text')
+        self.assertUsesIndex(queryset, 'questionnaire_api_ansewruser', '(user_id=?)')
+        self.assertUsesIndex(queryset, 'questionnaire_api_ansewruser_choice_answer',
+                             '(ansewruser_id=?)')
+
+    def test_active(self):
+        """Search for active polls."""
+        queryset = Questionnaire.objects.filter(
+            date_start__lte=date.today(), date_stop__gte=date.today())
+        self.assertUsesIndex(queryset, 'questionnaire_api_questionnaire',
+                             'questionnaire_dates_idx (date_start<?)')
@@ -0,0 +1,58 @@
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+
+from authentication.cache import user_cache
+from authentication.models import User
+from authentication.testing import reload_revoked_tokens
+from questionnaire import metrics
+
+
+class MetricsTest(TestCase):
+    """
+    Test for the timing of requests
+    """
+    fixtures = ['initial_data.json']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username='admin',
+            email='admin@gmail.com',
+            password='12345678')
+
+    def setUp(self):
+        metrics.reset()
+        user_cache.clear()
+        reload_revoked_tokens()
+
+    def test_server_timing(self):
+        """The time of the phases of the request is sent in the header."""
+        resp = self.client.get(reverse('questionnaire-list'),
+                               HTTP_AUTHORIZATION='Bearer ' + self.user.token)
+
+        phases = [item.split(';')[0] for item in resp['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['auth', 'db', 'serialize', 'render', 'total'])
+        self.assertIn(';desc="2 queries"', resp['Server-Timing'])
+
+    async def test_server_timing_asgi(self):
+        """Queries made in the threads of `sync_to_async` are measured as well."""
+        resp = await AsyncClient().get(reverse('questionnaire-list'))
+
+        phases = [item.split(';')[0] for item in resp['Server-Timing'].split(', ')]
+        self.assertIn('db', phases)
+        self.assertIn(';desc="1 queries"', resp['Server-Timing'])
+
+    def test_metrics(self):
+        """Histograms by routes are available only to administrators."""
+        self.client.get(reverse('questionnaire-list'))
+
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, 403)
+
+        resp = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ' + self.user.token)
+        content = resp.content.decode()
+        self.assertIn('questionnaire_request_seconds_count'
+                      '{route="questionnaire-list",method="GET",phase="total"} 1', content)
+        self.assertIn('questionnaire_request_queries_bucket'
+                      '{route="questionnaire-list",method="GET",le="1"} 1', content)
+        self.assertIn('questionnaire_jwt_user_cache_misses_total', content)
@@ -0,0 +1,77 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from authentication.models import RevokedToken, User
+from questionnaire.routers import ReplicaRouter, replica_reads
+from questionnaire_api.models import Answer, Questionnaire
+
+
+class ReplicaRouterTest(TestCase):
+    """
+    Test for the routing of reads to replicas
+    """
+    fixtures = ['initial_data.json']
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def read_in_blocks(self, blocks):
+        """The replica of every block, which is the same for all reads of the block."""
+        aliases = []
+        for _ in range(blocks):
+            with replica_reads():
+                aliases.append(self.router.db_for_read(Questionnaire))
+                self.assertEqual(self.router.db_for_read(Answer), aliases[-1])
+        return aliases
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_round_robin(self):
+        """Replicas are used by turns, only when allowed."""
+        self.assertEqual(self.router.db_for_read(Questionnaire), 'default')
+        with replica_reads(allowed=False):
+            self.assertEqual(self.router.db_for_read(Questionnaire), 'default')
+        self.assertEqual(self.read_in_blocks(3), ['replica_0', 'replica_1', 'replica_0'])
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'],
+                       DATABASE_REPLICA_STRATEGY='least_recently_used')
+    def test_least_recently_used(self):
+        first, second, third = self.read_in_blocks(3)
+        self.assertEqual({first, second}, {'replica_0', 'replica_1'})
+        self.assertEqual(third, first)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_read_after_write(self):
+        """After a write the reads go to the primary database."""
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Questionnaire), 'default')
+            self.assertEqual(self.router.db_for_read(Questionnaire), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_authentication_primary(self):
+        """Users and revoked tokens are always read from the primary database."""
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_read(RevokedToken), 'default')
+            self.assertEqual(self.router.db_for_read(Questionnaire), 'replica_0')
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate('default', 'questionnaire_api'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'questionnaire_api'))
+
+    def test_pin_cookie(self):
+        """A client that changed data gets the cookie for reading from the primary."""
+        resp = self.client.get(reverse('questionnaire-list'))
+        self.assertNotIn('db_pin', resp.cookies)
+
+        resp = self.client.post(reverse('user_login'),
+                                {'email': 'nobody@gmail.com', 'password': '12345678'},
+                                content_type='application/json')
+        self.assertNotIn('db_pin', resp.cookies)
+
+        resp = self.client.post(reverse('user_registration'),
+                                {'email': 'new@gmail.com', 'username': 'new',
+                                 'password': '12345678'},
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.cookies['db_pin']['max-age'], 5)
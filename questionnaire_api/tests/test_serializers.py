@@ -0,0 +1,31 @@
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from questionnaire_api.models import Answer, Question, Questionnaire
+from questionnaire_api.serializers import (
+    AnswerSerializer, QuestionSerializer, QuestionnaireSerializer,
+    answer_values, question_values, questionnaire_values,
+)
+
+
+class ValuesSerializerTest(TestCase):
+    """
+    Test for class ValuesSerializer
+    """
+    fixtures = ['initial_data.json']
+
+    def test_same_output(self):
+        """The output is the same as the output of the model serializer."""
+        Questionnaire.objects.filter(id=2).update(date_start='2020-11-23', date_stop='2020-12-01')
+
+        for model, serializer_class, values_serializer in (
+                (Questionnaire, QuestionnaireSerializer, questionnaire_values),
+                (Question, QuestionSerializer, question_values),
+                (Answer, AnswerSerializer, answer_values),
+        ):
+            queryset = model.objects.order_by('id')
+            expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+            with self.assertNumQueries(1):
+                rows = values_serializer.to_representation(values_serializer.values(queryset))
+            self.assertEqual(JSONRenderer().render(rows), expected)
@@ -0,0 +1,165 @@
+import json
+import unittest
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from questionnaire_api import results, sharding, throttling
+from questionnaire_api.models import AnsewrUser, Question, QuestionResult
+from questionnaire_api.tests.base import ShardedTestCase
+
+
+class ShardForTest(TestCase):
+    """
+    Test for the choice of the shard of a user
+    """
+    def test_jump_hash(self):
+        """Adding a bucket moves keys only to the new bucket."""
+        for key in range(1000):
+            before, after = sharding.jump_hash(key, 3), sharding.jump_hash(key, 4)
+            self.assertIn(after, (before, 3))
+
+        counts = [0] * 4
+        for key in range(4000):
+            counts[sharding.jump_hash(key, 4)] += 1
+        self.assertTrue(all(800 < count < 1200 for count in counts))
+
+    @override_settings(ANSWER_SHARDS=['default', 'answers_1'])
+    def test_router(self):
+        answer = AnsewrUser(user_id=1, question_id=1)
+        router = sharding.ShardRouter()
+        expected = sharding.shard_for(1)
+        self.assertEqual(router.db_for_write(AnsewrUser, instance=answer),
+                         None if expected == 'default' else expected)
+        self.assertIsNone(router.db_for_read(AnsewrUser))
+        self.assertIsNone(router.db_for_read(Question, instance=answer))
+
+        self.assertIsNone(router.allow_migrate('default', 'questionnaire_api', 'question'))
+        self.assertTrue(router.allow_migrate('answers_1', 'questionnaire_api', 'ansewruser'))
+        self.assertFalse(router.allow_migrate('answers_1', 'questionnaire_api', 'question'))
+        self.assertFalse(router.allow_migrate('answers_1', 'questionnaire_api'))
+
+
+@unittest.skipUnless(len(settings.ANSWER_SHARDS) > 1,
+                     'Run the tests with questionnaire.settings_test to test several shards.')
+class ShardedAnswersTest(ShardedTestCase):
+    """
+    Test for user answers stored in several shards
+    """
+
+    def setUp(self):
+        throttling.reset()
+        # A user for each shard, the fixture has answers only in the main database.
+        self.users = {}
+        for user_id in range(100, 1000):
+            self.users.setdefault(sharding.shard_for(user_id), user_id)
+
+    def answer(self, user_id, question, **data):
+        return self.client.post(reverse('answer_user-list'), data=json.dumps(
+            dict(data, user_id=user_id, question=question)), content_type='application/json')
+
+    def test_create(self):
+        """Answers are saved in the shard of the user with IDs from its range."""
+        for alias, user_id in self.users.items():
+            resp = self.answer(user_id, 3, choice_answer=[1])
+            self.assertEqual(resp.status_code, 201)
+            self.assertGreaterEqual(resp.data['id'], sharding.first_id(alias))
+            for other in sharding.shards():
+                self.assertEqual(AnsewrUser.objects.using(other).filter(
+                    user_id=user_id).exists(), other == alias)
+
+            resp = self.answer(user_id, 3, choice_answer=[2])
+            self.assertEqual(resp.status_code, 403)
+
+        self.assertEqual(QuestionResult.objects.get(question_id=3).count, len(self.users))
+
+    def test_list(self):
+        """The list merges the shards by ID."""
+        for user_id in self.users.values():
+            self.answer(user_id, 3, choice_answer=[2])
+            self.answer(user_id, 1, text_answer='Rain.')
+
+        ids, url = [], reverse('answer_user-list') + '?page_size=3'
+        while url:
+            resp = self.client.get(url)
+            ids.extend(answer['id'] for answer in resp.data['results'])
+            url = resp.data['next']
+        self.assertEqual(len(ids), 1 + 2 * len(self.users))
+        self.assertEqual(ids, sorted(ids))
+
+        resp = self.client.get(reverse('answer_user-detail', kwargs={'pk': ids[-1]}))
+        self.assertEqual(resp.data['choice_answer'], [])
+        resp = self.client.get(reverse('answer_user-detail', kwargs={'pk': ids[-2]}))
+        self.assertEqual(resp.data['choice_answer'], [2])
+
+    def test_update_user(self):
+        """The user of an answer cannot be changed, the answer would stay in the old shard."""
+        (first, user_id), (second, other_id) = list(self.users.items())[:2]
+        answer_id = self.answer(user_id, 3, choice_answer=[1]).data['id']
+
+        url = reverse('answer_user-detail', kwargs={'pk': answer_id})
+        resp = self.client.patch(url, data=json.dumps({'user_id': other_id}),
+                                 content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.content, b'{"user_id":["The user of an answer cannot be changed."]}')
+        self.assertEqual(AnsewrUser.objects.using(first).get(pk=answer_id).user_id, user_id)
+        self.assertEqual(self.answer(other_id, 3, choice_answer=[1]).status_code, 201)
+
+        resp = self.client.patch(url, data=json.dumps({'user_id': user_id, 'choice_answer': [2]}),
+                                 content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['choice_answer'], [2])
+
+    def test_get_user_responses(self):
+        user_id = self.users[sharding.shards()[-1]]
+        self.answer(user_id, 3, choice_answer=[1])
+
+        resp = self.client.get(reverse('get_user_responses', kwargs={'pk': user_id}))
+        self.assertEqual(resp.content, b'{"Clothes questionnaire.":'
+                                       b'{"What kind of clothes do you like?":["I like shoes."]}}')
+
+    def test_delete_question(self):
+        """Answers to a deleted question are deleted from all shards."""
+        for user_id in self.users.values():
+            self.answer(user_id, 3, choice_answer=[1])
+
+        Question.objects.get(pk=3).delete()
+        through = AnsewrUser.choice_answer.through
+        for alias in sharding.shards():
+            self.assertFalse(AnsewrUser.objects.using(alias).filter(question_id=3).exists())
+            self.assertFalse(through.objects.using(alias).filter(answer_id=1).exists())
+
+    def test_reshard(self):
+        """Answers in a wrong shard are moved with their IDs and options."""
+        user_id = self.users[sharding.shards()[-1]]
+        answer = AnsewrUser.objects.using('default').create(user_id=user_id, question_id=3)
+        AnsewrUser.choice_answer.through.objects.using('default').create(
+            ansewruser_id=answer.pk, answer_id=2)
+
+        call_command('reshard', stdout=StringIO())
+
+        self.assertFalse(AnsewrUser.objects.using('default').filter(user_id=user_id).exists())
+        moved = AnsewrUser.objects.using(sharding.shards()[-1]).get(pk=answer.pk)
+        self.assertEqual(moved.user_id, user_id)
+        self.assertEqual(str(moved), 'I like shirt.')
+
+        results.rebuild()
+        self.assertEqual(QuestionResult.objects.get(question_id=3).count, 1)
+
+    def test_reshard_conflict(self):
+        """An answer to a question the user already answered in the new shard is kept."""
+        alias = sharding.shards()[-1]
+        user_id = self.users[alias]
+        self.answer(user_id, 1, text_answer='Rain.')
+        answer = AnsewrUser.objects.using('default').create(
+            user_id=user_id, question_id=1, text_answer='Snow.')
+
+        stderr = StringIO()
+        call_command('reshard', stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('Kept 1 answers in default', stderr.getvalue())
+        self.assertEqual(AnsewrUser.objects.using('default').get(pk=answer.pk).text_answer, 'Snow.')
+        self.assertEqual(AnsewrUser.objects.using(alias).get(user_id=user_id).text_answer, 'Rain.')
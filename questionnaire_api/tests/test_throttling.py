@@ -0,0 +1,83 @@
+import json
+import timeit
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+
+from questionnaire_api import throttling
+from questionnaire_api.tests.base import ShardedTestCase
+
+
+class ThrottlingTest(ShardedTestCase):
+    """
+    Test for the limits of answers
+    """
+
+    def setUp(self):
+        throttling.reset()
+
+    def answer(self, user_id, **extra):
+        return self.client.post(reverse('answer_user-list'), data=json.dumps(
+            {'user_id': user_id, 'question': 2, 'text_answer': 'Yes.'}),
+            content_type='application/json', **extra)
+
+    def test_token_bucket(self):
+        buckets = throttling.TokenBuckets(max_size=2)
+        self.assertEqual(buckets.take('a', 1, 2), 0)
+        self.assertEqual(buckets.take('a', 1, 2), 0)
+        self.assertGreater(buckets.take('a', 1, 2), 0.9)
+
+        buckets.take('b', 1, 2)
+        buckets.take('c', 1, 2)
+        self.assertEqual(buckets.take('a', 1, 2), 0)
+
+        seconds = timeit.timeit(lambda: buckets.take('a', 1000000, 1000000), number=10000)
+        self.assertLess(seconds / 10000, 0.0001)
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'answer_user': '2/minute'}))
+    def test_user_rate(self):
+        """Answers of one user above the rate are refused without saving."""
+        self.assertEqual(self.answer(2).status_code, 201)
+        self.assertEqual(self.answer(2).status_code, 403)
+
+        with self.assertNumQueries(0):
+            resp = self.answer(2)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '30')
+        self.assertEqual(self.answer(3).status_code, 201)
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'answer_ip': '2/second'}))
+    def test_ip_rate(self):
+        self.answer(2)
+        self.answer(3)
+        self.assertEqual(self.answer(4).status_code, 429)
+        self.assertEqual(self.answer(4, REMOTE_ADDR='10.0.0.2').status_code, 201)
+        self.assertEqual(self.client.get(reverse('answer_user-list')).status_code, 200)
+        resp = self.answer(5, HTTP_X_FORWARDED_FOR='10.0.0.3')
+        self.assertEqual(resp.status_code, 429)
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'answer_ip': '1/second'}, NUM_PROXIES=1))
+    def test_ip_rate_behind_proxy(self):
+        """Behind a proxy the address of the client is taken from X-Forwarded-For."""
+        self.assertEqual(self.answer(2, HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 201)
+        self.assertEqual(self.answer(3, HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 429)
+        self.assertEqual(self.answer(3, HTTP_X_FORWARDED_FOR='10.0.0.4').status_code, 201)
+
+    @override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, MAX_CONCURRENT_WRITES=1))
+    def test_concurrent_writes(self):
+        """Writes above the limit are refused while the other writes are handled."""
+        self.assertTrue(throttling.writes.acquire(1))
+        try:
+            resp = self.answer(2)
+            self.assertEqual(resp.status_code, 429)
+            self.assertEqual(resp['Retry-After'], '1')
+            self.assertEqual(self.client.get(reverse('answer_user-list')).status_code, 200)
+        finally:
+            throttling.writes.release()
+
+        self.assertEqual(self.answer(2).status_code, 201)
+        self.assertEqual(throttling.writes.active, 0)
@@ -1,20 +1,34 @@
 import json
+import time
 from datetime import date, timedelta
-
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from authentication.models import User
+from authentication.testing import reload_revoked_tokens
+from questionnaire_api import analytics, export, ingestion, sharding, throttling
 from questionnaire_api.models import (
-    Questionnaire
+    Answer, AnswerResult, AnsewrUser, Question, QuestionResult, Questionnaire
 )
+from questionnaire_api.tests.base import ShardedTestCase
 
 
-class QuestionnaireViewSetViewTest(TestCase):
+class QuestionnaireViewSetViewTest(ShardedTestCase):
     """
     Test fot view class QuestionnaireViewSet
     """
-    fixtures = ['initial_data.json']
+
+    def setUp(self):
+        cache.clear()
+        throttling.reset()
 
     def test_active(self):
         """
@@ -50,6 +64,83 @@ class QuestionnaireViewSetViewTest(TestCase):
         resp = self.client.get(reverse('questionnaire_active'))
         self.assertEqual(resp.content, expected)
 
+    def test_active_cache(self):
+        """The list of active polls is cached until the poll is changed."""
+        today = date.today()
+        self.assertEqual(self.client.get(reverse('questionnaire_active')).content, b'[]')
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('questionnaire_active'))
+        self.assertEqual(resp.content, b'[]')
+
+        weather = Questionnaire.objects.get(id=1)
+        weather.date_start = today
+        weather.date_stop = today + timedelta(days=3)
+        weather.save()
+
+        resp = self.client.get(reverse('questionnaire_active'))
+        self.assertEqual(resp.json()[0]['id'], 1)
+
+        weather.delete()
+        self.assertEqual(self.client.get(reverse('questionnaire_active')).content, b'[]')
+
+    def test_bundle(self):
+        """Getting the poll with questions and answer options in one request."""
+        expected = b'{"id":2,"title":"Clothes","description":"Clothes questionnaire.",' \
+                   b'"date_start":null,"date_stop":null,"questions":[{"id":3,' \
+                   b'"question":"What kind of clothes do you like?",' \
+                   b'"type":2,"questionnaire_id":2,' \
+                   b'"answers":[{"id":1,"question_id":3,"text":"I like shoes."},' \
+                   b'{"id":2,"question_id":3,"text":"I like shirt."}]}]}'
+
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 2}))
+        self.assertEqual(resp.content, expected)
+
+        resp = self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 10}))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 'abc'}))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_bundle_started(self):
+        """The bundle of the started poll is kept in the cache until it is changed."""
+        clothes = Questionnaire.objects.get(id=2)
+        clothes.date_start = date.today()
+        clothes.save()
+
+        self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 2}))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 2}))
+
+        clothes.title = 'Shoes'
+        clothes.save()
+        resp = self.client.get(reverse('questionnaire-bundle', kwargs={'pk': 2}))
+        self.assertEqual(resp.json()['title'], 'Shoes')
+
+    def test_export(self):
+        """Downloading user answers to the survey in the NDJSON and CSV formats."""
+        AnsewrUser.objects.create(user_id=1, question_id=3).choice_answer.set([1, 2])
+        AnsewrUser.objects.create(user_id=2, question_id=3).choice_answer.set([2])
+
+        resp = self.client.get(reverse('questionnaire-export', kwargs={'pk': 2}))
+        expected = b'{"id": 2, "user_id": 1, "question_id": 3, ' \
+                   b'"question": "What kind of clothes do you like?", "text_answer": "", ' \
+                   b'"choice_answer": [1, 2], ' \
+                   b'"choice_text": ["I like shoes.", "I like shirt."]}\n' \
+                   b'{"id": 3, "user_id": 2, "question_id": 3, ' \
+                   b'"question": "What kind of clothes do you like?", "text_answer": "", ' \
+                   b'"choice_answer": [2], "choice_text": ["I like shirt."]}\n'
+        self.assertEqual(b''.join(resp.streaming_content), expected)
+
+        resp = self.client.get(reverse('questionnaire-export', kwargs={'pk': 2}), {'output': 'csv'})
+        expected = b'id,user_id,question_id,question,text_answer,choice_answer,choice_text\r\n' \
+                   b'2,1,3,What kind of clothes do you like?,,1;2,I like shoes.;I like shirt.\r\n' \
+                   b'3,2,3,What kind of clothes do you like?,,2,I like shirt.\r\n'
+        self.assertEqual(b''.join(resp.streaming_content), expected)
+
+        responses = export.iter_responses(2, chunk_size=1)
+        self.assertEqual([response['choice_answer'] for response in responses], [[1, 2], [2]])
+
     def test_questions(self):
         """
         Compliance of questions with polls is checked.
@@ -69,18 +160,213 @@ class QuestionnaireViewSetViewTest(TestCase):
 
         for i, expected in enumerate(expected_list, start=1):
             resp = self.client.get(reverse('questionnaire-questions', kwargs={'pk': i}))
-            self.assertEqual(resp.content, expected)
+            self.assertEqual(resp.content,
+                             b'{"next":null,"previous":null,"results":' + expected + b'}')
+
+    def test_list_pagination(self):
+        """Polls are returned page by page in the order of IDs."""
+        resp = self.client.get(reverse('questionnaire-list'), {'page_size': 3})
+        self.assertEqual([item['id'] for item in resp.data['results']], [1, 2, 3])
+        self.assertIsNone(resp.data['previous'])
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(resp.data['next'])
+        self.assertEqual([item['id'] for item in resp.data['results']], [4])
+        self.assertIsNone(resp.data['next'])
+
+    def test_results(self):
+        """The counters of answers change together with user answers."""
+        for data in (
+                {'user_id': 1, 'question': 3, 'choice_answer': [2]},
+                {'user_id': 2, 'question': 3, 'choice_answer': [2]},
+                {'user_id': 3, 'question': 3, 'choice_answer': [1]},
+        ):
+            self.client.post(reverse('answer_user-list'), data=json.dumps(data),
+                             content_type='application/json')
+        AnsewrUser.objects.get(user_id=3).delete()
+        AnsewrUser.objects.get(user_id=2).choice_answer.set([1])
+
+        expected = b'{"id":2,"title":"Clothes","questions":[{"id":3,' \
+                   b'"question":"What kind of clothes do you like?","type":2,"count":2,' \
+                   b'"answers":[{"id":1,"text":"I like shoes.","count":1},' \
+                   b'{"id":2,"text":"I like shirt.","count":1}]}]}'
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse('questionnaire-results', kwargs={'pk': 2}))
+        self.assertEqual(resp.content, expected)
+
+        QuestionResult.objects.update(count=0)
+        call_command('rebuild_results', stdout=StringIO())
+        resp = self.client.get(reverse('questionnaire-results', kwargs={'pk': 2}))
+        self.assertEqual(resp.content, expected)
+
+    def test_results_cascade(self):
+        """The options of the answers deleted with the poll are not selected one by one."""
+        def delete_poll(answers):
+            questionnaire = Questionnaire.objects.create(title='Weather', description='Weather')
+            question = Question.objects.create(questionnaire=questionnaire, question='?', type=3)
+            answer = Answer.objects.create(question=question, text='Sunny')
+            for user_id in range(1, answers + 1):
+                user_answer = AnsewrUser.objects.create(user_id=user_id, question=question)
+                user_answer.choice_answer.add(answer)
+            with CaptureQueriesContext(connection) as context:
+                questionnaire.delete()
+            self.assertFalse(QuestionResult.objects.filter(question=question).exists())
+            self.assertFalse(AnswerResult.objects.filter(answer=answer).exists())
+            return len(context)
+
+        self.assertEqual(delete_poll(2), delete_poll(11))
+
+        AnsewrUser.objects.create(user_id=1, question_id=4)
+        AnsewrUser.objects.filter(question_id=4).delete()
+        self.assertEqual(QuestionResult.objects.get(question_id=4).count, 0)
+
+    def test_crosstab(self):
+        """The choices of two questions are counted by pairs of options."""
+        question = Question.objects.create(questionnaire_id=2, question='Colours?', type=3)
+        red = Answer.objects.create(question=question, text='Red')
+        blue = Answer.objects.create(question=question, text='Blue')
+        for data in (
+                {'user_id': 1, 'question': 3, 'choice_answer': [1]},
+                {'user_id': 1, 'question': question.id, 'choice_answer': [red.id]},
+                {'user_id': 2, 'question': 3, 'choice_answer': [1]},
+                {'user_id': 2, 'question': question.id, 'choice_answer': [red.id, blue.id]},
+                {'user_id': 3, 'question': 3, 'choice_answer': [2]},
+                {'user_id': 3, 'question': question.id, 'choice_answer': [blue.id]},
+                {'user_id': 4, 'question': 3, 'choice_answer': [2]},
+        ):
+            self.client.post(reverse('answer_user-list'), data=json.dumps(data),
+                             content_type='application/json')
+
+        url = reverse('questionnaire-crosstab', kwargs={'pk': 2})
+        resp = self.client.get(url, {'rows': 3, 'columns': question.id})
+        self.assertEqual(resp.data['counts'], [[2, 1], [0, 1]])
+        self.assertEqual([answer['count'] for answer in resp.data['rows']['answers']], [3, 1])
+        self.assertEqual([answer['count'] for answer in resp.data['columns']['answers']], [2, 2])
+        self.assertEqual((resp.data['total'], resp.data['respondents']), (4, 3))
+        self.assertAlmostEqual(resp.data['chi_square'], 4 / 3)
+        self.assertEqual(resp.data['degrees_of_freedom'], 1)
+
+        resp = self.client.get(url, {'rows': 3})
+        self.assertEqual(resp.content, b'{"message":"No \'columns\' specified."}')
+        resp = self.client.get(url, {'rows': 3, 'columns': 5})
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse('questionnaire-crosstab', kwargs={'pk': 4}),
+                               {'rows': 5, 'columns': 6})
+        self.assertEqual(resp.status_code, 406)
+        resp = self.client.get(reverse('questionnaire-crosstab', kwargs={'pk': 'abc'}),
+                               {'rows': 3, 'columns': 3})
+        self.assertEqual(resp.status_code, 404)
+
+        # The option 9 was added after the options were read.
+        choices = np.array([[1, 1], [1, 9], [2, 2], [3, 1]])
+        self.assertEqual(analytics._one_hot(choices, np.array([1, 2]), np.array([1, 2])).tolist(),
+                         [[1, 0], [0, 1]])
+
+    def admin_headers(self):
+        user = User.objects.create_superuser(
+            username='admin', email='admin@gmail.com', password='12345678')
+        reload_revoked_tokens()
+        return {'HTTP_AUTHORIZATION': 'Bearer ' + user.token}
+
+    def test_tree(self):
+        """The survey is created with its questions and options in a constant number of queries."""
+        headers = self.admin_headers()
+
+        def tree(size):
+            return {'title': 'Pets', 'description': 'Pets questionnaire.', 'questions': [
+                {'question': 'Name?', 'type': 1},
+                *({'question': f'Pet {i}?', 'type': 2, 'answers': [
+                    {'text': f'Cat {i}'}, {'text': f'Dog {i}'}]} for i in range(size)),
+            ]}
+
+        with self.assertNumQueries(10):
+            resp = self.client.post(reverse('questionnaire-tree'), data=json.dumps(tree(1)),
+                                    content_type='application/json', **headers)
+        expected = b'{"id":5,"title":"Pets","description":"Pets questionnaire.",' \
+                   b'"date_start":null,"date_stop":null,"questions":[' \
+                   b'{"id":7,"question":"Name?","type":1,"answers":[]},' \
+                   b'{"id":8,"question":"Pet 0?","type":2,"answers":[' \
+                   b'{"id":6,"text":"Cat 0"},{"id":7,"text":"Dog 0"}]}]}'
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.content, expected)
+
+        # The same queries without the user, who is in the cache now.
+        with self.assertNumQueries(9):
+            resp = self.client.post(reverse('questionnaire-tree'), data=json.dumps(tree(50)),
+                                    content_type='application/json', **headers)
+        self.assertEqual(resp.status_code, 201)
+        questionnaire_id = resp.data['id']
+        self.assertEqual(Question.objects.filter(questionnaire_id=questionnaire_id).count(), 51)
+        self.assertEqual(QuestionResult.objects.filter(
+            question__questionnaire_id=questionnaire_id).count(), 51)
+        self.assertEqual(
+            list(Answer.objects.filter(question_id=resp.data['questions'][-1]['id']).values_list(
+                'id', 'text')),
+            [(answer['id'], answer['text']) for answer in resp.data['questions'][-1]['answers']])
+
+        bundle = self.client.get(reverse('questionnaire-bundle', kwargs={'pk': questionnaire_id}))
+        self.assertEqual(len(json.loads(bundle.content)['questions']), 51)
+
+    def test_tree_text_question_with_options(self):
+        resp = self.client.post(reverse('questionnaire-tree'), data=json.dumps({
+            'title': 'Pets', 'description': 'Pets questionnaire.', 'questions': [
+                {'question': 'Name?', 'type': 1, 'answers': [{'text': 'Rex'}]}]}),
+            content_type='application/json', **self.admin_headers())
+        expected = b'{"questions":[{"non_field_errors":' \
+                   b'["This type of question requires a text answer."]}]}'
+        self.assertEqual(resp.content, expected)
+        self.assertFalse(Questionnaire.objects.filter(title='Pets').exists())
+
+    def test_clone(self):
+        """The copy has the same questions and options, new IDs and no dates."""
+        Questionnaire.objects.filter(pk=2).update(date_start=date.today(), date_stop=date.today())
+        Question.objects.create(questionnaire_id=2, question='Size?', type=1)
+        headers = self.admin_headers()
+
+        with self.assertNumQueries(13):
+            resp = self.client.post(reverse('questionnaire-clone', kwargs={'pk': 2}), **headers)
+        expected = b'{"id":5,"title":"Clothes","description":"Clothes questionnaire.",' \
+                   b'"date_start":null,"date_stop":null,"questions":[' \
+                   b'{"id":8,"question":"What kind of clothes do you like?","type":2,' \
+                   b'"answers":[{"id":6,"text":"I like shoes."},' \
+                   b'{"id":7,"text":"I like shirt."}]},' \
+                   b'{"id":9,"question":"Size?","type":1,"answers":[]}]}'
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.content, expected)
+        self.assertEqual(AnswerResult.objects.filter(answer_id__in=[6, 7]).count(), 2)
+
+        resp = self.client.post(reverse('questionnaire-clone', kwargs={'pk': 100}), **headers)
+        self.assertEqual(resp.status_code, 404)
+
+    def test_add_questions(self):
+        """Questions with options are added only before the start of the survey."""
+        headers = self.admin_headers()
+        url = reverse('questionnaire-questions', kwargs={'pk': 4})
+        data = json.dumps([{'question': 'Favourite colour?', 'type': 3,
+                            'answers': [{'text': 'Red'}, {'text': 'Blue'}]}])
+
+        resp = self.client.post(url, data=data, content_type='application/json', **headers)
+        expected = b'[{"id":7,"question":"Favourite colour?","type":3,' \
+                   b'"answers":[{"id":6,"text":"Red"},{"id":7,"text":"Blue"}]}]'
+        self.assertEqual(resp.content, expected)
+
+        Questionnaire.objects.filter(pk=4).update(date_start=date.today())
+        resp = self.client.post(url, data=data, content_type='application/json', **headers)
+        self.assertEqual(resp.status_code, 403)
 
+        resp = self.client.post(url, data=data, content_type='application/json')
+        self.assertEqual(resp.status_code, 403)
 
-class QuestionViewSetTest(TestCase):
+
+class QuestionViewSetTest(ShardedTestCase):
     """
     Test fot view class QuestionViewSet
     """
-    fixtures = ['initial_data.json']
 
     @classmethod
     def setUpTestData(cls):
         """Create superuser."""
+        super().setUpTestData()
         User.objects.create_superuser(
             username='admin',
             email='admin@gmail.com',
@@ -212,20 +498,21 @@ class QuestionViewSetTest(TestCase):
         """Checking the receipt of answer options for a question."""
         resp = self.client.get(reverse('question-answers', kwargs={'pk': 3}))
 
-        expected = b'[{"id":1,"question_id":3,"text":"I like shoes."},' \
-                  b'{"id":2,"question_id":3,"text":"I like shirt."}]'
+        expected = b'{"next":null,"previous":null,"results":' \
+                   b'[{"id":1,"question_id":3,"text":"I like shoes."},' \
+                   b'{"id":2,"question_id":3,"text":"I like shirt."}]}'
         self.assertEqual(resp.content, expected)
 
 
-class AnswerViewSetTest(TestCase):
+class AnswerViewSetTest(ShardedTestCase):
     """
     Test fot view class AnswerViewSet
     """
-    fixtures = ['initial_data.json']
 
     @classmethod
     def setUpTestData(cls):
         """Create superuser."""
+        super().setUpTestData()
         User.objects.create_superuser(
             username='admin',
             email='admin@gmail.com',
@@ -362,9 +649,11 @@ class AnswerViewSetTest(TestCase):
         self.assertEqual(resp.content, expected)
 
 
-class AnswerUserViewSetTest(TestCase):
+class AnswerUserViewSetTest(ShardedTestCase):
     """Test fot view class AnswerUserViewSet"""
-    fixtures = ['initial_data.json']
+
+    def setUp(self):
+        throttling.reset()
 
     def test_create(self):
         """Checking the creation of answers to questions of any user."""
@@ -395,9 +684,243 @@ class AnswerUserViewSetTest(TestCase):
                                     content_type='application/json')
             self.assertEqual(resp.content, expected_list[i])
 
+    def test_update_repeated(self):
+        """An answer cannot be moved to a question the user has already answered."""
+        self.client.post(reverse('answer_user-list'), content_type='application/json',
+                         data=json.dumps({'user_id': 1, 'question': 2, 'text_answer': 'Yes.'}))
+
+        resp = self.client.patch(reverse('answer_user-detail', kwargs={'pk': 1}),
+                                 data=json.dumps({'question': 2}), content_type='application/json')
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(resp.content,
+                         b'{"message":"The user already has an answer to this question."}')
+        self.assertEqual(AnsewrUser.objects.get(pk=1).question_id, 1)
+        self.assertEqual(QuestionResult.objects.get(question_id=1).count, 1)
+        self.assertEqual(QuestionResult.objects.get(question_id=2).count, 1)
+
     def test_get_user_responses(self):
         """Checking for user responses to survey questions."""
         expected = b'{"Weather questionnaire.":{"What kind of weather do you like?":["I like sunny weather."]}}'
 
         resp = self.client.get(reverse('get_user_responses', kwargs={'pk': 1}))
         self.assertEqual(resp.content, expected)
+
+    def test_create_schema(self):
+        """Answers are checked against the compiled schema of the question."""
+        dataset = [
+            {'user_id': 1, 'question': 3, 'choice_answer': [3]},
+            {'user_id': 1, 'question': 4, 'choice_answer': [3, 3]},
+            {'user_id': 1, 'question': 6, 'text_answer': 'x' * 501},
+            {'user_id': 'one', 'question': 6, 'text_answer': 'Yes.'},
+            {'user_id': 1.5, 'question': 6, 'text_answer': 'Yes.'},
+            {'user_id': 1, 'question': 60, 'text_answer': 'Yes.'},
+        ]
+        expected_list = [
+            b'{"message":"Invalid answer option for this question."}',
+            b'{"message":"Each answer option can be chosen only once."}',
+            b'{"message":"The answer must be no longer than 500 characters."}',
+            b'{"message":"The user ID must be an integer."}',
+            b'{"message":"The user ID must be an integer."}',
+            b'{"message":"No such question."}',
+        ]
+
+        for data, expected in zip(dataset, expected_list):
+            resp = self.client.post(reverse('answer_user-list'), data=json.dumps(data),
+                                    content_type='application/json')
+            self.assertEqual(resp.content, expected)
+
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.post(reverse('answer_user-list'), content_type='application/json',
+                                    data=json.dumps({'user_id': 1, 'question': 4,
+                                                     'choice_answer': [3, 4]}))
+        self.assertEqual(resp.status_code, 201)
+        selects = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"questionnaire_api_ansewruser"."id"', selects[0])
+
+    def test_create_form(self):
+        """All options repeated in a form are saved."""
+        resp = self.client.post(reverse('answer_user-list'),
+                                {'user_id': 2, 'question': 4, 'choice_answer': [3, 4]})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['choice_answer'], [3, 4])
+
+    @override_settings(ANSWER_INGESTION={
+        'MODE': 'buffered', 'BATCH_SIZE': 100, 'FLUSH_INTERVAL': 3600,
+        'QUEUE_SIZE': 2, 'PUT_TIMEOUT': 0,
+    })
+    def test_create_buffered(self):
+        """Answers are queued and written together."""
+        self.addCleanup(ingestion.shutdown)
+        dataset = [
+            {'user_id': 2, 'question': 3, 'choice_answer': [2]},
+            {'user_id': 2, 'question': 6, 'text_answer': 'Yes.'},
+            {'user_id': 3, 'question': 6, 'text_answer': 'No.'},
+        ]
+        expected_list = [
+            (202, b'{"status":"queued"}'),
+            (202, b'{"status":"queued"}'),
+            (503, b'{"message":"Too many answers are waiting to be saved, try again later."}'),
+        ]
+
+        for data, expected in zip(dataset, expected_list):
+            resp = self.client.post(reverse('answer_user-list'), data=json.dumps(data),
+                                    content_type='application/json')
+            self.assertEqual((resp.status_code, resp.content), expected)
+        self.assertEqual(AnsewrUser.objects.filter(user_id=2).count(), 0)
+
+        ingestion.shutdown()
+        answers = AnsewrUser.objects.filter(user_id=2).order_by('id')
+        self.assertEqual([answer.question_id for answer in answers], [3, 6])
+        self.assertEqual(list(answers[0].choice_answer.values_list('id', flat=True)), [2])
+
+    def test_buffer_survives_errors(self):
+        """The background thread keeps writing after a batch fails."""
+        buffer = ingestion.AnswerBuffer(batch_size=1, flush_interval=0, max_size=10, put_timeout=0)
+        written = []
+
+        def write(batch):
+            if not written:
+                written.append(None)
+                raise RuntimeError('Lost connection.')
+            written.extend(batch)
+
+        with mock.patch.object(buffer, '_write', side_effect=write), \
+                self.assertLogs('questionnaire_api.ingestion', 'ERROR'):
+            buffer.submit({'user_id': 2})
+            buffer.submit({'user_id': 3})
+            deadline = time.monotonic() + 5
+            while len(written) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(written, [None, {'user_id': 3}])
+            self.assertTrue(buffer.is_alive())
+            self.assertEqual(buffer.failed, 1)
+            buffer.stop()
+
+    def test_bulk(self):
+        """Creating answers to all questions of the survey in one request."""
+        data = {
+            'user_id': 2,
+            'questionnaire': 4,
+            'answers': [
+                {'question': 5, 'choice_answer': [5]},
+                {'question': 6, 'text_answer': 'Yes.'},
+            ]
+        }
+
+        with self.assertNumQueries(10):
+            resp = self.client.post(reverse('answer_user-bulk'), data=json.dumps(data),
+                                    content_type='application/json')
+
+        expected = b'[{"id":2,"user_id":2,"question":5,"text_answer":"","choice_answer":[5]},' \
+                   b'{"id":3,"user_id":2,"question":6,"text_answer":"Yes.","choice_answer":[]}]'
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.content, expected)
+
+    def test_bulk_errors(self):
+        """Answers are not saved if at least one of them is invalid."""
+        data = {
+            'user_id': 1,
+            'questionnaire': 1,
+            'answers': [
+                {'question': 1, 'text_answer': 'I like rain.'},
+                {'question': 2, 'text_answer': 'Yes.'},
+                {'question': 3, 'choice_answer': [1]},
+                {'question': 2, 'text_answer': 'No.'},
+            ]
+        }
+
+        resp = self.client.post(reverse('answer_user-bulk'), data=json.dumps(data),
+                                content_type='application/json')
+
+        expected = b'{"errors":[' \
+                   b'{"index":0,"question":1,' \
+                   b'"message":"The user already has an answer to this question."},' \
+                   b'{"index":2,"question":3,' \
+                   b'"message":"The question does not belong to this questionnaire."},' \
+                   b'{"index":3,"question":2,' \
+                   b'"message":"The user already has an answer to this question."}]}'
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(resp.content, expected)
+        self.assertEqual(AnsewrUser.objects.count(), 1)
+
+        for answers in ('Yes.', [{'question': 1, 'text_answer': 'Yes.'}, 'No.']):
+            resp = self.client.post(reverse('answer_user-bulk'), content_type='application/json',
+                                    data=json.dumps(dict(data, answers=answers)))
+            self.assertEqual(resp.status_code, 406)
+            self.assertEqual(resp.content, b'{"message":"\'answers\' must be a list of objects."}')
+
+    def test_search(self):
+        """Text answers are found by words, ranked and kept in sync with changes."""
+        for user_id, text in ((2, 'Sunny and warm weather, sunny days.'),
+                              (3, 'Rainy weather.'), (4, 'I like snow.')):
+            self.client.post(reverse('answer_user-list'), data=json.dumps(
+                {'user_id': user_id, 'question': 2, 'text_answer': text}),
+                content_type='application/json')
+
+        url = reverse('answer_user-search')
+        resp = self.client.get(url, {'q': 'sunny weather', 'questionnaire': 1})
+        self.assertEqual(resp.data['count'], 2)
+        self.assertEqual([answer['user_id'] for answer in resp.data['results']], [2, 1])
+        self.assertEqual(resp.data['results'][1]['snippet'],
+                         'I like <mark>sunny</mark> <mark>weather</mark>.')
+
+        resp = self.client.get(url, {'q': 'weath*', 'question': 2, 'page_size': 1})
+        self.assertEqual((resp.data['count'], len(resp.data['results'])), (2, 1))
+        self.assertIn('page=2', resp.data['next'])
+        resp = self.client.get(resp.data['next'])
+        self.assertIsNone(resp.data['next'])
+        self.assertIn('page=1', resp.data['previous'])
+
+        answer = sharding.sharded(AnsewrUser.objects.all()).get(user_id=4)
+        answer.text_answer = 'Sunny weather.'
+        answer.save()
+        AnsewrUser.objects.get(user_id=1).delete()
+        resp = self.client.get(url, {'q': 'sunny', 'questionnaire': 1})
+        self.assertEqual(sorted(answer['user_id'] for answer in resp.data['results']), [2, 4])
+        resp = self.client.get(url, {'q': 'snow', 'questionnaire': 1})
+        self.assertEqual(resp.data['count'], 0)
+
+        resp = self.client.get(url, {'q': '"sunny', 'question': 1})
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.get(url, {'q': 'sunny'})
+        self.assertEqual(resp.status_code, 406)
+
+    def test_search_snippet_escaped(self):
+        """The text of the answer is escaped in the snippet, only the marks are HTML."""
+        self.client.post(reverse('answer_user-list'), data=json.dumps(
+            {'user_id': 2, 'question': 2, 'text_answer': '<script>alert(1)</script> sunny & warm'}),
+            content_type='application/json')
+
+        resp = self.client.get(reverse('answer_user-search'), {'q': 'sunny', 'question': 2})
+        self.assertEqual(resp.data['results'][0]['snippet'],
+                         '&lt;script&gt;alert(1)&lt;/script&gt; <mark>sunny</mark> &amp; warm')
+
+    def test_get_user_responses_by_id(self):
+        """Checking for user responses grouped by IDs."""
+        AnsewrUser.objects.create(user_id=1, question_id=3).choice_answer.set([1, 2])
+
+        expected = b'{"1":{"1":[{"id":1,"text_answer":"I like sunny weather.",' \
+                   b'"choice_answer":[]}]},' \
+                   b'"2":{"3":[{"id":2,"text_answer":"","choice_answer":[1,2]}]}}'
+
+        resp = self.client.get(reverse('get_user_responses', kwargs={'pk': 1}), {'keys': 'id'})
+        self.assertEqual(resp.content, expected)
+
+    def test_get_user_responses_num_queries(self):
+        """The number of queries does not depend on the number of responses.
+
+        Responses and questions are read separately, they can be in different databases.
+        """
+        with self.assertNumQueries(3):
+            self.client.get(reverse('get_user_responses', kwargs={'pk': 1}))
+
+        for question_id in (2, 3, 4, 5, 6):
+            answer = AnsewrUser.objects.create(user_id=1, question_id=question_id,
+                                               text_answer='Yes.')
+            answer.choice_answer.set([1, 3])
+
+        with self.assertNumQueries(4):
+            resp = self.client.get(reverse('get_user_responses', kwargs={'pk': 1}))
+        self.assertEqual(len(resp.data['Animals questionnaire.']), 2)
@@ -0,0 +1,160 @@
+"""Limits of requests that change data.
+
+The limits are checked in the memory of the process before the request
+reaches the database. Rates are set in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+by the scopes 'answer_user' (per `user_id` of the answer) and 'answer_ip'
+(per address of the client), for example '10/second'; the number of requests
+of the rate can be made at once. REST_FRAMEWORK['MAX_CONCURRENT_WRITES'] limits
+the number of requests that change data at the same time in the process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import validation
+
+BUCKETS_MAX_SIZE = 100000
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """The rate like '10/second' as the pair (number of requests, seconds)."""
+    number, period = rate.split('/')
+    return int(number), PERIODS[period[0]]
+
+
+class TokenBuckets:
+    """Buckets of tokens by keys.
+
+    A bucket holds up to `capacity` tokens and gets `rate` tokens per second,
+    every request takes one token. The least recently used buckets are
+    dropped when there are more than `max_size` of them.
+    """
+    def __init__(self, max_size=BUCKETS_MAX_SIZE):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Taking a token, returns 0 or the number of seconds until the next token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class ConcurrencyLimit:
+    """Counter of requests that are being handled at the same time."""
+    def __init__(self):
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.active >= limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+buckets = TokenBuckets()
+writes = ConcurrencyLimit()
+
+
+def reset():
+    buckets.clear()
+
+
+class WriteRateThrottle(BaseThrottle):
+    """Token bucket throttle of requests that change data.
+
+    The rate is taken from DEFAULT_THROTTLE_RATES by `scope`,
+    requests without a key or a rate are not limited.
+    """
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        if request.method in SAFE_METHODS:
+            return True
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        key = self.get_key(request)
+        if not rate or key is None:
+            return True
+
+        number, seconds = parse_rate(rate)
+        self.wait_time = buckets.take((self.scope, key), number / seconds, number)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnswerUserThrottle(WriteRateThrottle):
+    """Limit of answers of one user, by `user_id` of the request."""
+    scope = 'answer_user'
+
+    def get_key(self, request):
+        get = getattr(request.data, 'get', None)
+        return validation.to_int(get('user_id')) if get else None
+
+
+class AnswerIPThrottle(WriteRateThrottle):
+    """Limit of answers from one address of the client.
+
+    X-Forwarded-For is trusted only when NUM_PROXIES is set, otherwise the
+    client could start a new bucket with every request by changing it.
+    """
+    scope = 'answer_ip'
+
+    def get_key(self, request):
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
+
+
+class WriteLimitMixin:
+    """Mixin of views that refuses requests changing data above MAX_CONCURRENT_WRITES.
+
+    The place is taken after the checks of permissions and throttles
+    and is freed when the response is ready.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        limit = settings.REST_FRAMEWORK.get('MAX_CONCURRENT_WRITES')
+        if request.method in SAFE_METHODS or not limit:
+            return
+        if not writes.acquire(limit):
+            raise Throttled(wait=1)
+        self._holds_write = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, '_holds_write', False):
+            self._holds_write = False
+            writes.release()
+        return super().finalize_response(request, response, *args, **kwargs)
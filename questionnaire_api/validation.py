@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import FrozenSet, NamedTuple
+
+from .models import Answer, AnsewrUser, Question
+
+SCHEMAS_MAX_SIZE = 1000
+# Schemas are reset by signals only in the process where the question changed,
+# other processes compile them again after this number of seconds.
+SCHEMAS_TIMEOUT = 60
+
+TEXT_MAX_LENGTH = AnsewrUser._meta.get_field('text_answer').max_length
+
+
+class QuestionSchema(NamedTuple):
+    """Rules for answers to the question."""
+    id: int
+    questionnaire_id: int
+    type: int
+    answer_ids: FrozenSet[int]
+    min_choices: int
+    max_choices: int
+    max_text_length: int
+
+
+def compile_question(pk, questionnaire_id, type_question, answer_ids):
+    if type_question == 1:
+        return QuestionSchema(pk, questionnaire_id, type_question, frozenset(), 0, 0,
+                              TEXT_MAX_LENGTH)
+    max_choices = 1 if type_question == 2 else len(answer_ids)
+    return QuestionSchema(pk, questionnaire_id, type_question, frozenset(answer_ids),
+                          1, max_choices, 0)
+
+
+def compile_questionnaire(questionnaire_id):
+    """Compiling the schemas of all questions of the poll with two queries."""
+    answer_ids = defaultdict(list)
+    for question_id, pk in Answer.objects.filter(
+            question__questionnaire_id=questionnaire_id).values_list('question_id', 'id'):
+        answer_ids[question_id].append(pk)
+
+    return {
+        pk: compile_question(pk, questionnaire_id, type_question, answer_ids[pk])
+        for pk, type_question in Question.objects.filter(
+            questionnaire_id=questionnaire_id).values_list('id', 'type')
+    }
+
+
+_schemas = OrderedDict()
+_questionnaires = {}
+_lock = threading.Lock()
+
+
+def get_questionnaire_schemas(questionnaire_id):
+    """Returns the dict {question ID: QuestionSchema} of the poll.
+
+    Schemas are kept in the memory of the process until the questions or
+    answer options of the poll change.
+    """
+    if questionnaire_id is None:
+        return {}
+    with _lock:
+        item = _schemas.get(questionnaire_id)
+        if item is not None and item[0] > time.monotonic():
+            _schemas.move_to_end(questionnaire_id)
+            return item[1]
+
+    schemas = compile_questionnaire(questionnaire_id)
+    with _lock:
+        _schemas[questionnaire_id] = (time.monotonic() + SCHEMAS_TIMEOUT, schemas)
+        _schemas.move_to_end(questionnaire_id)
+        for pk in schemas:
+            _questionnaires[pk] = questionnaire_id
+        if len(_schemas) > SCHEMAS_MAX_SIZE:
+            _, (_, removed) = _schemas.popitem(last=False)
+            for pk in removed:
+                _questionnaires.pop(pk, None)
+    return schemas
+
+
+def get_schema(question_id):
+    """Returns the schema of the question or None if there is no such question."""
+    question_id = to_int(question_id)
+    if question_id is None:
+        return None
+
+    questionnaire_id = _questionnaires.get(question_id)
+    if questionnaire_id is None:
+        questionnaire_id = Question.objects.filter(pk=question_id).values_list(
+            'questionnaire_id', flat=True).first()
+        if questionnaire_id is None:
+            return None
+    return get_questionnaire_schemas(questionnaire_id).get(question_id)
+
+
+def invalidate(questionnaire_id=None, question_id=None):
+    """Removing the schemas of the poll, which can be found by its question."""
+    with _lock:
+        if questionnaire_id is None:
+            questionnaire_id = _questionnaires.get(question_id)
+        item = _schemas.pop(questionnaire_id, None)
+        if item is not None:
+            for pk in item[1]:
+                _questionnaires.pop(pk, None)
+
+
+def validate(schema, data):
+    """Checking the answer `data` against the schema of the question.
+
+    Returns the error message or None if the answer is valid.
+    Question types:
+    1. Reply in text
+    2. Answer with a choice of one option
+    3. Multiple choice answer
+    """
+    text_answer = data.get('text_answer')
+    choice_answer = choices(data)
+
+    if to_int(data.get('user_id')) is None:
+        return "The user ID must be an integer."
+    elif text_answer and choice_answer:
+        return "It is forbidden to answer simultaneously " \
+               "with the text and the choice of answers."
+    elif text_answer and not schema.max_text_length:
+        return "There should be no textual response."
+    elif choice_answer and not schema.max_choices:
+        return "The answer must be text."
+    elif choice_answer:
+        if len(choice_answer) > schema.max_choices and schema.max_choices == 1:
+            return "This question requires only one answer option."
+        elif len(choice_answer) < schema.min_choices:
+            return f"Choose at least {schema.min_choices} answer options."
+        elif not set(choice_answer) <= schema.answer_ids:
+            return "Invalid answer option for this question."
+        elif len(set(choice_answer)) != len(choice_answer):
+            return "Each answer option can be chosen only once."
+    elif not text_answer:
+        return "The question must be answered."
+    elif not isinstance(text_answer, str):
+        return "The answer must be text."
+    elif len(text_answer) > schema.max_text_length:
+        return f"The answer must be no longer than {schema.max_text_length} characters."
+
+
+def to_int(value):
+    """Integer from a whole number or a string with digits, otherwise None."""
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def choices(data):
+    """IDs of the chosen answer options, a single ID is turned into a list.
+
+    A form may repeat the field for each option, all of them are taken.
+    """
+    if hasattr(data, 'getlist'):
+        choice_answer = data.getlist('choice_answer')
+    else:
+        choice_answer = data.get('choice_answer') or []
+    if not isinstance(choice_answer, list):
+        choice_answer = [choice_answer]
+    return [to_int(answer_id) for answer_id in choice_answer]
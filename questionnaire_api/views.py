@@ -1,20 +1,44 @@
 from collections import defaultdict
-from datetime import date
 
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from . import analytics, cache, export, ingestion, search, sharding, validation
+from .bulk import (
+    clone_questionnaire, create_questionnaire, create_questions, create_user_answers, get_choices,
+)
 from .models import Answer, AnsewrUser, Question, Questionnaire
 from .permissions import IsAdminOrReadOnly
 from .serializers import (
     AnswerSerializer, AnswerUserSerializer, QuestionSerializer,
-    QuestionnaireSerializer,
+    QuestionTreeSerializer, QuestionnaireSerializer, QuestionnaireTreeSerializer,
+    answer_values, question_values, questionnaire_values,
 )
+from .throttling import AnswerIPThrottle, AnswerUserThrottle, WriteLimitMixin
+
+
+class ValuesListMixin:
+    """Mixin that serializes lists with `values_serializer` without model instances."""
+    values_serializer = None
 
+    def list(self, request, *args, **kwargs):
+        return self.values_response(self.filter_queryset(self.get_queryset()))
 
-class QuestionnaireViewSet(viewsets.ModelViewSet):
+    def values_response(self, queryset, values_serializer=None):
+        values_serializer = values_serializer or self.values_serializer
+        queryset = values_serializer.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(values_serializer.to_representation(queryset))
+        return self.get_paginated_response(values_serializer.to_representation(page))
+
+
+class QuestionnaireViewSet(WriteLimitMixin, ValuesListMixin, viewsets.ModelViewSet):
     """This class contains polls.
 
     Allows admins to create, edit and delete polls and receive all polls.
@@ -23,27 +47,164 @@ class QuestionnaireViewSet(viewsets.ModelViewSet):
     """
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = QuestionnaireSerializer
+    values_serializer = questionnaire_values
     queryset = Questionnaire.objects.all()
 
-    @staticmethod
-    def active(self):
-        """This method only represents active polls."""
-        questionnaire = Questionnaire.objects.filter(
-            date_start__lte=date.today()).filter(
-            date_stop__gte=date.today())
-        serializer = QuestionnaireSerializer(questionnaire, many=True)
-        return Response(serializer.data)
+    def active(self, request):
+        """This method only represents active polls.
 
-    @action(detail=True)
+        The rendered list is taken from the cache, see `cache.get_active`.
+        """
+        return HttpResponse(cache.get_active(), content_type='application/json')
+
+    @action(detail=False, methods=['post'])
+    def tree(self, request):
+        """This method for creating a survey with its questions and answer options.
+
+        The whole tree is written in one transaction with a constant number
+        of queries, see `bulk.create_questionnaire`.
+        """
+        serializer = QuestionnaireTreeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            questionnaire = create_questionnaire(serializer.validated_data)
+        return Response(QuestionnaireTreeSerializer(questionnaire).data, status=201)
+
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """This method for copying the survey with its questions and answer options.
+
+        The copy is written in one transaction with a constant number of
+        queries and has no start and stop dates, see `bulk.clone_questionnaire`.
+        """
+        questionnaire = get_object_or_404(Questionnaire, pk=pk)
+        with transaction.atomic():
+            copy = clone_questionnaire(questionnaire)
+        return Response(QuestionnaireTreeSerializer(copy).data, status=201)
+
+    @action(detail=True, methods=['get', 'post'])
     def questions(self, request, pk=None):
-        """This method for getting questions on a specific survey."""
+        """This method for getting questions on a specific survey.
+
+        POST adds a list of questions with their answer options at once,
+        see `bulk.create_questions`. If the questionnaire has a start date
+        for the survey, it is prohibited to add new questions.
+        """
+        if request.method == 'POST':
+            questionnaire = get_object_or_404(Questionnaire, pk=pk)
+            if questionnaire.date_start:
+                return Response({
+                    "message": "After specifying the start date of the survey, "
+                               "you cannot create new questions."
+                }, status=403)
+            serializer = QuestionTreeSerializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                questions = create_questions(questionnaire.pk, serializer.validated_data)
+            return Response(QuestionTreeSerializer(questions, many=True).data, status=201)
+
         questionnaire = Questionnaire.objects.get(pk=pk)
         questions = Question.objects.filter(questionnaire=questionnaire)
-        serializer = QuestionSerializer(questions, many=True)
-        return Response(serializer.data)
+        return self.values_response(questions, question_values)
+
+    @action(detail=True)
+    def bundle(self, request, pk=None):
+        """This method for getting the survey with its questions and answer options.
+
+        See `cache.get_bundle`.
+        """
+        content = cache.get_bundle(pk)
+        if content is None:
+            raise Http404
+        return HttpResponse(content, content_type='application/json')
+
+    @action(detail=True)
+    def export(self, request, pk=None):
+        """This method for downloading all user answers to the survey.
 
+        The answers are streamed in the NDJSON format, or in CSV with the
+        parameter `output=csv`.
+        """
+        questionnaire = get_object_or_404(Questionnaire, pk=pk)
+        responses = export.iter_responses(questionnaire.pk)
+
+        if request.query_params.get('output') == 'csv':
+            response = StreamingHttpResponse(
+                export.iter_csv(responses), content_type='text/csv')
+            extension = 'csv'
+        else:
+            response = StreamingHttpResponse(
+                export.iter_ndjson(responses), content_type='application/x-ndjson')
+            extension = 'ndjson'
+        response['Content-Disposition'] = \
+            f'attachment; filename="questionnaire-{questionnaire.pk}.{extension}"'
+        return response
+
+    @action(detail=True)
+    def results(self, request, pk=None):
+        """This method for getting the number of answers to the survey questions.
+
+        The counters are updated together with user answers,
+        so the time does not depend on the number of answers.
+        """
+        questionnaire = get_object_or_404(Questionnaire, pk=pk)
+        questions = Question.objects.filter(questionnaire=questionnaire).order_by(
+            'id').values('id', 'question', 'type', 'result__count')
+        answers = defaultdict(list)
+        for answer in Answer.objects.filter(question__questionnaire=questionnaire).order_by(
+                'id').values('id', 'question_id', 'text', 'result__count'):
+            answers[answer['question_id']].append({
+                'id': answer['id'],
+                'text': answer['text'],
+                'count': answer['result__count'] or 0,
+            })
+
+        return Response({
+            'id': questionnaire.id,
+            'title': questionnaire.title,
+            'questions': [{
+                'id': question['id'],
+                'question': question['question'],
+                'type': question['type'],
+                'count': question['result__count'] or 0,
+                'answers': answers[question['id']],
+            } for question in questions],
+        })
+
+    @action(detail=True)
+    def crosstab(self, request, pk=None):
+        """This method for getting the cross-tabulation of two questions of the survey.
 
-class QuestionViewSet(viewsets.ModelViewSet):
+        The parameters `rows` and `columns` contain the IDs of questions with
+        answer options. See `analytics.crosstab`.
+        """
+        pk = validation.to_int(pk)
+        if pk is None:
+            raise Http404
+
+        question_ids = []
+        for param in ('rows', 'columns'):
+            question_id = validation.to_int(request.query_params.get(param))
+            if question_id is None:
+                return Response({
+                    "message": f"No '{param}' specified."
+                }, status=406)
+            question_ids.append(question_id)
+
+        types = dict(Question.objects.filter(
+            questionnaire_id=pk, id__in=question_ids).values_list('id', 'type'))
+        if any(question_id not in types for question_id in question_ids):
+            return Response({
+                "message": "The question does not belong to this questionnaire."
+            }, status=404)
+        if 1 in types.values():
+            return Response({
+                "message": "Cross-tabulation is available only for questions with answer options."
+            }, status=406)
+        return Response(analytics.crosstab(*question_ids))
+
+
+class QuestionViewSet(WriteLimitMixin, ValuesListMixin, viewsets.ModelViewSet):
     """This class represents questions.
 
     Allows administrators to create, edit and delete questions.
@@ -51,6 +212,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
     """
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = QuestionSerializer
+    values_serializer = question_values
     queryset = Question.objects.all()
 
     def create(self, request, *args, **kwargs):
@@ -106,14 +268,14 @@ class QuestionViewSet(viewsets.ModelViewSet):
         """This method for getting answers on a specific question."""
         question = Question.objects.get(pk=pk)
         answers = Answer.objects.filter(question=question)
-        serializer = AnswerSerializer(answers, many=True)
-        return Response(serializer.data)
+        return self.values_response(answers, answer_values)
 
 
-class AnswerViewSet(viewsets.ModelViewSet):
+class AnswerViewSet(WriteLimitMixin, ValuesListMixin, viewsets.ModelViewSet):
     """This is a answer view class that you can use to create, modify, or delete answers."""
     permission_classes = (IsAdminOrReadOnly, )
     serializer_class = AnswerSerializer
+    values_serializer = answer_values
     queryset = Answer.objects.all()
 
     def create(self, request, *args, **kwargs):
@@ -168,19 +330,58 @@ class AnswerViewSet(viewsets.ModelViewSet):
         }, status=403)
 
 
-class AnswerUserViewSet(viewsets.ModelViewSet):
-    """This class contains user responses to questions."""
+class AnswerUserViewSet(WriteLimitMixin, viewsets.ModelViewSet):
+    """This class contains user responses to questions.
+
+    The responses are stored in the shards of users, see `sharding`.
+    Answers are limited per user and per client, see `throttling`.
+    """
     serializer_class = AnswerUserSerializer
+    throttle_classes = (AnswerUserThrottle, AnswerIPThrottle)
     queryset = AnsewrUser.objects.all()
 
+    def get_queryset(self):
+        return sharding.sharded(self.queryset.all())
+
+    def list(self, request, *args, **kwargs):
+        """The list of responses.
+
+        The chosen options of the page are read with one query in each shard.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        answers = list(queryset) if page is None else page
+        serializer = self.get_serializer(answers, many=True, context=dict(
+            self.get_serializer_context(), choices=get_choices(answers)))
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
     def create(self, request, *args, **kwargs):
-        """Method for creating answer for questions."""
+        """Method for creating answer for questions.
+
+        The answer is checked against the compiled schema of the question,
+        see `validation.validate`, and is saved without reading the database.
+        """
         if request.data.get('question'):
-            question = Question.objects.get(id=request.data['question'])
-            type_question = question.type
-            message = self._is_valid_answer(request, type_question)
+            schema = validation.get_schema(request.data['question'])
+            if schema is None:
+                return Response({
+                    "message": "No such question."
+                }, status=404)
+            message = self._is_valid_answer(request, schema)
             if not message:
-                return super().create(request, *args, **kwargs)
+                answer = self._answer_data(request.data, schema)
+                if ingestion.is_buffered():
+                    return self._queue_answer(answer)
+                try:
+                    with transaction.atomic():
+                        result = create_user_answers([answer])
+                    return Response(result[0], status=201)
+                except IntegrityError:
+                    if not self._is_already_answer(answer):
+                        raise
+                    message = "The user already has an answer to this question."
             return Response({
                 "message": f"{message}"
             }, status=403)
@@ -188,52 +389,227 @@ class AnswerUserViewSet(viewsets.ModelViewSet):
             "message": "No 'question' specified."
         }, status=406)
 
+    def update(self, request, *args, **kwargs):
+        """Method for changing answers of users.
+
+        Like a new answer, the changed one is rejected by the constraint
+        'unique_user_answer' if the user has already answered the question.
+        """
+        try:
+            return super().update(request, *args, **kwargs)
+        except IntegrityError:
+            return Response({
+                "message": "The user already has an answer to this question."
+            }, status=403)
+
+    def perform_update(self, serializer):
+        # The counters in the main database are moved by signals, they are
+        # rolled back together with the answer.
+        aliases = {sharding.PRIMARY, serializer.instance._state.db or sharding.PRIMARY}
+        with sharding.atomic(sorted(aliases)):
+            serializer.save()
+
+    def _queue_answer(self, answer):
+        """Adding the answer to the queue instead of writing it at once.
+
+        Used when ANSWER_INGESTION['MODE'] is 'buffered', see `ingestion.AnswerBuffer`.
+        """
+        if self._is_already_answer(answer):
+            return Response({
+                "message": "The user already has an answer to this question."
+            }, status=403)
+
+        if not ingestion.get_buffer().submit(answer):
+            return Response({
+                "message": "Too many answers are waiting to be saved, try again later."
+            }, status=503, headers={'Retry-After': '1'})
+        return Response({"status": "queued"}, status=202)
+
+    @staticmethod
+    def _answer_data(data, schema):
+        """The checked answer in the format of `bulk.create_user_answers`."""
+        return {
+            'user_id': validation.to_int(data['user_id']),
+            'question_id': schema.id,
+            'text_answer': data.get('text_answer') or '',
+            'choice_answer': validation.choices(data),
+        }
+
+    @staticmethod
+    def _is_already_answer(answer):
+        """Checking whether the user has ever answered this question."""
+        return sharding.using(AnsewrUser.objects.filter(
+            user_id=answer['user_id'], question_id=answer['question_id']),
+            sharding.shard_for(answer['user_id'])).exists()
+
     @staticmethod
-    def _is_valid_answer(request, type_question):
+    def _is_valid_answer(request, schema):
         """Checking the user's response.
 
-        It checks whether the user has ever answered this question and,
-        if he did not answer, whether the answer matches the type of question.
-        Question types:
-        1. Reply in text
-        2. Answer with a choice of one option
-        3. Multiple choice answer
-        """
-        user_id = request.data.get('user_id')
-        question_id = request.data.get('question')
-        is_already_answer = AnsewrUser.objects.filter(
-            user_id=user_id).filter(question_id=question_id)
-
-        if is_already_answer:
-            return "The user already has an answer to this question."
-        elif request.data.get('text_answer') and request.data.get('choice_answer'):
-            return "It is forbidden to answer simultaneously " \
-                   "with the text and the choice of answers."
-        elif request.data.get('text_answer') and type_question in (2, 3):
-            return "There should be no textual response."
-        elif request.data.get('choice_answer') and type_question == 1:
-            return "The answer must be text."
-        elif request.data.get('choice_answer'):
-            if len(request.data.get('choice_answer')) > 1 and type_question == 2:
-                return "This question requires only one answer option."
-        elif not request.data.get('text_answer') and not request.data.get('choice_answer'):
-            return "The question must be answered."
+        It checks whether the answer matches the schema of the question.
+        A repeated answer to the question is rejected by the constraint
+        'unique_user_answer' when saving.
+        """
+        return validation.validate(schema, request.data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Creating answers to all questions of the survey in one request.
+
+        The request contains 'user_id', 'questionnaire' and the list 'answers'
+        with the fields 'question', 'text_answer' and 'choice_answer'.
+        All answers are checked together and are saved only if there are
+        no errors, otherwise the errors for each answer are returned.
+        """
+        for field in ('user_id', 'questionnaire', 'answers'):
+            if not request.data.get(field):
+                return Response({
+                    "message": f"No '{field}' specified."
+                }, status=406)
+
+        user_id = request.data['user_id']
+        data = request.data['answers']
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            return Response({
+                "message": "'answers' must be a list of objects."
+            }, status=406)
+
+        schemas = validation.get_questionnaire_schemas(
+            validation.to_int(request.data['questionnaire']))
+        answered = set()
+        # A wrong user ID is reported for each answer by `validation.validate`.
+        if validation.to_int(user_id) is not None:
+            answered = set(sharding.using(AnsewrUser.objects.filter(
+                user_id=validation.to_int(user_id), question_id__in=schemas),
+                sharding.shard_for(validation.to_int(user_id))).values_list(
+                'question_id', flat=True))
+
+        answers, errors = [], []
+        for index, item in enumerate(data):
+            question_id = validation.to_int(item.get('question'))
+            schema = schemas.get(question_id)
+
+            if not item.get('question'):
+                message = "No 'question' specified."
+            elif schema is None:
+                message = "The question does not belong to this questionnaire."
+            elif question_id in answered:
+                message = "The user already has an answer to this question."
+            else:
+                message = validation.validate(schema, dict(item, user_id=user_id))
+
+            if message:
+                errors.append({
+                    "index": index, "question": item.get('question'), "message": message
+                })
+                continue
+            answered.add(question_id)
+            answers.append(self._answer_data(dict(item, user_id=user_id), schema))
+
+        if errors:
+            return Response({"errors": errors}, status=403)
+
+        try:
+            with transaction.atomic():
+                result = create_user_answers(answers)
+        except IntegrityError:
+            return Response({
+                "message": "The user already has an answer to this question."
+            }, status=403)
+        return Response(result, status=201)
+
+    @action(detail=False)
+    def search(self, request):
+        """Full-text search of text answers to a question or to a questionnaire.
+
+        The parameter `q` contains the words to find, `question` or
+        `questionnaire` limits the search. The answers are ranked and split
+        into pages by `page` and `page_size`. See `search.search`.
+        """
+        if not request.query_params.get('q'):
+            return Response({
+                "message": "No 'q' specified."
+            }, status=406)
+
+        question_id = validation.to_int(request.query_params.get('question'))
+        questionnaire_id = validation.to_int(request.query_params.get('questionnaire'))
+        if question_id is not None:
+            question_ids = [question_id]
+        elif questionnaire_id is not None:
+            question_ids = list(Question.objects.filter(
+                questionnaire_id=questionnaire_id).values_list('id', flat=True))
+        else:
+            return Response({
+                "message": "No 'question' or 'questionnaire' specified."
+            }, status=406)
+
+        page = max(validation.to_int(request.query_params.get('page')) or 1, 1)
+        page_size = self.paginator.get_page_size(request)
+        count, answers = search.search(
+            request.query_params['q'], question_ids, (page - 1) * page_size, page_size)
+
+        url = request.build_absolute_uri()
+        return Response({
+            'count': count,
+            'next': replace_query_param(url, 'page', page + 1)
+            if page * page_size < count else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': answers,
+        })
 
     @action(detail=True)
     def get_user_responses(self, request, pk=None):
-        """Retrieve user responses to survey questions."""
-        answers = AnsewrUser.objects.filter(user_id=pk)
+        """Retrieve user responses to survey questions.
 
-        result = defaultdict(dict)
+        By default the responses are grouped by the descriptions of the surveys
+        and the texts of the questions. With the parameter `keys=id` they are
+        grouped by IDs, and each response contains its ID, text and chosen options.
+        The number of queries does not depend on the number of responses.
+        """
+        by_id = request.query_params.get('keys') == 'id'
+        user_id = validation.to_int(pk)
+        if user_id is None:
+            raise Http404
+        alias = sharding.shard_for(user_id)
+
+        choices = defaultdict(list)
+        through = AnsewrUser.choice_answer.through
+        for answer_user_id, answer_id in sharding.using(through.objects.filter(
+                ansewruser__user_id=user_id).order_by('id'), alias).values_list(
+                'ansewruser_id', 'answer_id'):
+            choices[answer_user_id].append(answer_id)
+
+        rows = list(sharding.using(AnsewrUser.objects.filter(
+            user_id=user_id).order_by('id'), alias).values_list(
+            'id', 'text_answer', 'question_id'))
+
+        # Questions and answer options are in the main database, not in the shard.
+        questions = {
+            question_id: rest for question_id, *rest in Question.objects.filter(
+                id__in={row[2] for row in rows}).values_list(
+                'id', 'question', 'questionnaire_id', 'questionnaire__description')
+        }
+        if not by_id:
+            options = dict(Answer.objects.filter(id__in={
+                answer_id for answer_ids in choices.values() for answer_id in answer_ids
+            }).values_list('id', 'text'))
+            for answer_ids in choices.values():
+                answer_ids[:] = [options[answer_id] for answer_id in answer_ids]
+        answers = (row + tuple(questions[row[2]]) for row in rows)
+
+        result = defaultdict(lambda: defaultdict(list))
 
         for answer in answers:
-            answer_s = str(answer)
-            question_s = str(answer.question)
-            questionnaire_s = str(answer.question.questionnaire)
-
-            if result[questionnaire_s].get(question_s):
-                result[questionnaire_s][question_s].append(answer_s)
+            answer_id, text_answer, question_id, question_s, \
+                questionnaire_id, questionnaire_s = answer
+            if by_id:
+                result[questionnaire_id][question_id].append({
+                    'id': answer_id,
+                    'text_answer': text_answer,
+                    'choice_answer': choices[answer_id],
+                })
             else:
-                result[questionnaire_s][question_s] = [answer_s]
+                answer_s = text_answer or ', '.join(choices[answer_id])
+                result[questionnaire_s][question_s].append(answer_s)
 
         return Response(result)